@@ -1,12 +1,18 @@
-from aerate.sphinx import (
-    FunctionDocumenter, MacroDocumenter, TypeDocumenter, StructDocumenter,
-)
 import os
 
 __all__ = ("setup")
 
 
 def setup(sphinx):
+    # This is imported here so that aerate can be used without Sphinx (such
+    # as with python -m aerate) without the cost of importing it
+    from aerate.sphinx import (
+        FunctionDocumenter, MacroDocumenter, TypeDocumenter, StructDocumenter,
+        FileDocumenter, GroupDocumenter, DescriptionDirective,
+        on_builder_inited, on_env_get_outdated, on_env_purge_doc,
+        on_env_merge_info, on_env_updated, on_build_finished,
+    )
+
     sphinx.setup_extension("sphinx.ext.autodoc")
 
     # The location of the XML output from Doxygen (should be the same as the
@@ -16,6 +22,43 @@ def setup(sphinx):
                             os.path.join(sphinx.confdir, "xml"),
                             "env")
 
+    # The maximum size of the cache of parsed XML documents from Doxygen. This
+    # is either a number of documents or a string number of bytes with a K, M,
+    # or G suffix (such as "512M"). The least recently used document is
+    # evicted when the cache is full. The default is an unlimited cache.
+    sphinx.add_config_value("aerate_document_cache_size", None, "")
+
+    # The maximum size of the cache of rendered descriptions that's stored in
+    # between builds, in the same form as aerate_document_cache_size. A size
+    # of 0 disables the cache.
+    sphinx.add_config_value("aerate_render_cache_size", "64M", "")
+
+    # Whether to adjust and render every aeration in the Doxygen XML into the
+    # render cache when the build starts, on a pool of processes. This is
+    # either True to use a process for each CPU or a number of processes.
+    sphinx.add_config_value("aerate_prewarm", False, "")
+
+    # Whether to render each description as docutils nodes (with the node
+    # renderer) and insert them into the document as they are, rather than
+    # render it as reST that's then parsed by Sphinx
+    sphinx.add_config_value("aerate_render_nodes", False, "env")
+
+    # Whether to print the stats of aerate's caches in the main process (see
+    # Aerate.stats) when the build finishes
+    sphinx.add_config_value("aerate_stats", False, "")
+
+    # Whether to count and time the use of each rule in aerate's engines. The
+    # summary is printed when the build finishes and written as JSON to the
+    # file at this path (relative to the directory containing `conf.py`), or
+    # to "aerate/profile.json" in the doctree directory if it's True.
+    sphinx.add_config_value("aerate_profile", False, "")
+
+    # Whether to record the time spent to load, adjust, and render each
+    # aeration (in each process) as a Chrome trace. This is written as JSON to
+    # the file at this path, in the same form as aerate_profile, and can be
+    # opened in Perfetto.
+    sphinx.add_config_value("aerate_trace", False, "")
+
     sphinx.add_event("aerate-generate-anchor")
 
     sphinx.aerate = None
@@ -23,5 +66,18 @@ def setup(sphinx):
     sphinx.add_autodocumenter(MacroDocumenter)
     sphinx.add_autodocumenter(TypeDocumenter)
     sphinx.add_autodocumenter(StructDocumenter)
+    sphinx.add_autodocumenter(FileDocumenter)
+    sphinx.add_autodocumenter(GroupDocumenter)
+    sphinx.add_directive("aerate-description", DescriptionDirective)
+
+    # This is after other handlers, as one of them may run Doxygen
+    sphinx.connect("builder-inited", on_builder_inited, priority=900)
+    sphinx.connect("env-get-outdated", on_env_get_outdated)
+    sphinx.connect("env-purge-doc", on_env_purge_doc)
+    sphinx.connect("env-merge-info", on_env_merge_info)
+    sphinx.connect("env-updated", on_env_updated)
+    sphinx.connect("build-finished", on_build_finished)
 
-    return {"version": "0.0.1", "parallel_read_safe": True}
+    return {
+        "version": "0.0.1", "env_version": 4, "parallel_read_safe": True,
+    }
@@ -0,0 +1,42 @@
+from aerate.aerate import Aerate
+from aerate.convert import convert
+import argparse
+import sys
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m aerate",
+        description="Convert the Doxygen XML in DOXYGEN_ROOT into a reST "
+                    "file for each compound in OUTPUT.")
+    parser.add_argument("doxygen_root", metavar="DOXYGEN_ROOT")
+    parser.add_argument("output", metavar="OUTPUT")
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=None,
+        help="the number of worker processes (default: the number of CPUs)")
+    parser.add_argument(
+        "--cache", metavar="DIRECTORY", default=None,
+        help="store the symbol index and render cache in DIRECTORY")
+    parser.add_argument(
+        "--cache-size", metavar="SIZE", default="64M",
+        help="the maximum size of the render cache (default: 64M)")
+    parser.add_argument(
+        "-q", "--quiet", action="store_true",
+        help="don't print the path to each file that's written")
+    args = parser.parse_args(argv)
+
+    aerate = Aerate(args.doxygen_root, cache_root=args.cache,
+                    render_cache_size=args.cache_size)
+
+    status = 0
+    for path, written, errors in convert(aerate, args.output, args.jobs):
+        if written and not args.quiet:
+            print(path)
+        for error in errors:
+            print(f"aerate: {error}", file=sys.stderr)
+            status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
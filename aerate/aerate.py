@@ -1,9 +1,15 @@
 from aerate.aeration import Aeration
+from aerate.cache import DocumentCache, RenderCache, parse_cache_size
 from aerate.engine import Renderer
+from aerate.index import SymbolIndex, canonical_nodes
 from aerate.mutation import MutationEngine
+from aerate.nodes import NodeRenderer
 from lxml import etree
+from contextlib import nullcontext
 from lxml.etree import XMLParser
+import hashlib
 import os
+import time
 
 # The XML parser to be used to load each document
 PARSER = XMLParser(
@@ -12,15 +18,59 @@ PARSER = XMLParser(
 
 
 class Aerate:
-    def __init__(self, sphinx):
+    """
+    Used to adjust and render the Doxygen XML in the *doxygen_root*.
+
+    The symbol index and the render cache are stored in the *cache_root* in
+    between runs, or aren't stored at all if it's ``None``. The size of the
+    document cache and of the render cache are as in
+    :func:`~aerate.cache.parse_cache_size`.
+
+    The anchor of an aeration is looked up in the *anchors* map from its id.
+    Otherwise, if the instance has a *sphinx* application, the anchor is
+    generated by the ``aerate-generate-anchor`` event. An instance in a Sphinx
+    build should be made with :meth:`from_sphinx`.
+
+    If the instance has a *tracer* (a :class:`~aerate.trace.Tracer`) then the
+    time spent to load, adjust, and render each aeration is recorded in it.
+    """
+
+    @classmethod
+    def from_sphinx(cls, sphinx):
+        """Make an instance from the configuration of the *sphinx* app."""
+
+        config = sphinx.config
+        return cls(
+            config.aerate_doxygen_root,
+            cache_root=os.path.join(sphinx.doctreedir, "aerate"),
+            document_cache_size=config.aerate_document_cache_size,
+            render_cache_size=config.aerate_render_cache_size,
+            sphinx=sphinx)
+
+    def __init__(self, doxygen_root, cache_root=None, document_cache_size=None,
+                 render_cache_size=None, anchors=None, sphinx=None):
         self.sphinx = sphinx
-        self.doxygen_root = sphinx.config.aerate_doxygen_root
+        self.doxygen_root = doxygen_root
+        self.cache_root = cache_root
+        self.anchors = anchors if anchors is not None else {}
 
         self.aeration_memo = {}
+        self.file_digest_memo = {}
 
-        self.document_memo = {}
+        self.document_cache = DocumentCache(
+            *parse_cache_size(document_cache_size))
+
+        # The number of documents parsed, their size, and the time to parse
+        self.parsed = 0
+        self.parsed_bytes = 0
+        self.parse_time = 0.0
+
+        self.render_cache = RenderCache(
+            None if cache_root is None else os.path.join(cache_root, "render"),
+            *parse_cache_size(render_cache_size))
         self.sentries = set()
-        self.document = self.load_document("index.xml")
+        self.tracer = None
+        self.index = self.load_index()
 
         self.adjuster = MutationEngine(self)
         self.adjuster.load_recipe("aerate.recipe.adjuster")
@@ -30,13 +80,52 @@ class Aerate:
         self.renderer = Renderer(self)
         self.renderer.load_recipe("aerate.recipe.renderer")
 
+        self.node_renderer = NodeRenderer(self)
+        self.node_renderer.load_recipe("aerate.recipe.node_renderer")
+
     def __getitem__(self, id):
         """Return the aeration of an object from its *id*."""
+        self.signal_aeration_used(id)
         if id not in self.aeration_memo:
-            node = self.canonical_node_by_id(id)
-            self.aeration_memo[id] = Aeration.make(self, node)
+            self.aeration_memo[id] = Aeration.make(self, self.index[id])
         return self.aeration_memo[id]
 
+    @property
+    def document(self):
+        """Return the ``index.xml`` document."""
+        return self.load_document("index.xml")
+
+    @property
+    def fingerprint(self):
+        """Return a digest of the recipe of each engine in the instance."""
+        return ":".join(engine.fingerprint for engine in (
+            self.adjuster, self.reformer, self.renderer))
+
+    def generate_anchor(self, aeration):
+        """
+        Return the anchor of the *aeration* or ``None`` to use its name.
+        """
+
+        if aeration.id in self.anchors:
+            return self.anchors[aeration.id]
+        if self.sphinx is not None:
+            return self.sphinx.emit_firstresult(
+                "aerate-generate-anchor", aeration)
+        return None
+
+    def resolve(self, id):
+        """
+        Return the ``(kind, name, anchor)`` of the aeration with the *id*.
+
+        This is ``None`` if there's no aeration with the *id*.
+        """
+
+        try:
+            aeration = self[id]
+        except LookupError:
+            return None
+        return (aeration.kind, aeration.name, aeration.anchor)
+
     def adjust(self, node, *args, **kwargs):
         """Use the configured adjuster to adjust the *node*."""
         return self.adjuster.handle(node, *args, **kwargs)
@@ -49,20 +138,142 @@ class Aerate:
         """Use the configured renderer to render the *node*."""
         return self.renderer.invoke(node, *args, **kwargs)
 
-    def load_document(self, name):
-        """Load and memoize an XML document from the Doxygen root."""
+    def render_nodes(self, node, *args, **kwargs):
+        """Use the configured node renderer to render the *node*."""
+        return self.node_renderer.invoke(node, *args, **kwargs)
 
-        if name not in self.document_memo:
-            self.document_memo[name] = etree.parse(
-                os.path.join(self.doxygen_root, name),
-                PARSER)
+    def load_document(self, name):
+        """Load and cache an XML document from the Doxygen root."""
+        return self.load_entry(name).document
+
+    def load_entry(self, name):
+        """
+        Load and cache an XML document from the Doxygen root.
+
+        Return the document's :class:`~aerate.cache.DocumentEntry` in the
+        :attr:`document_cache`. Anything that refers to nodes in the document
+        should be stored in the entry's *memo* rather than held elsewhere, so
+        that it's released when the document is evicted from the cache.
+        """
+
+        entry = self.document_cache.get(name)
+        if entry is None:
+            path = os.path.join(self.doxygen_root, name)
+            with self.trace("load_document", file=name) as args:
+                size = args["bytes"] = os.path.getsize(path)
+                start = time.perf_counter()
+                document = etree.parse(path, PARSER)
+                self.parse_time += time.perf_counter() - start
+            self.parsed += 1
+            self.parsed_bytes += size
+            entry = self.document_cache.put(name, document, size)
         self.signal_document_used(name)
-        return self.document_memo[name]
+        return entry
+
+    def load_index(self):
+        """
+        Load the symbol index of ``index.xml``.
+
+        The index is stored in the :attr:`cache_root` keyed by the digest of
+        ``index.xml``. If the stored index doesn't match then it's rebuilt from
+        ``index.xml`` and stored again.
+        """
+
+        if self.cache_root is None:
+            return SymbolIndex.from_document(self.document)
+
+        digest = self.file_digest("index.xml")
+        path = os.path.join(self.cache_root, "index.bin")
+        index = SymbolIndex.load(path, digest)
+        if index is None:
+            index = SymbolIndex.from_document(self.document)
+            try:
+                index.dump(path, digest)
+            except OSError:
+                return index
+            # Use the stored index (like any other process would) rather
+            # than hold the one that was built or the parsed index.xml
+            index = SymbolIndex.load(path, digest) or index
+            self.document_cache.discard("index.xml")
+        return index
+
+    def file_digest(self, name):
+        """Return the SHA-256 digest of an XML file in the Doxygen root."""
+
+        if name not in self.file_digest_memo:
+            path = os.path.join(self.doxygen_root, name)
+            with open(path, "rb") as file:
+                digest = hashlib.sha256(file.read()).hexdigest()
+            self.file_digest_memo[name] = digest
+        return self.file_digest_memo[name]
+
+    def stats(self, largest=5):
+        """
+        Return a dictionary of statistics of the instance's caches and memos.
+
+        This includes the :meth:`~aerate.cache.DocumentCache.stats` of the
+        document cache along with the number of documents parsed, their size,
+        the time spent to parse them, and the number of elements in each
+        document that it retains; the stats of the render cache; the number of
+        entries in each memo (as nothing is evicted from a memo, each entry is
+        a miss) and the number of aerations with a memoized anchor; the stats
+        of each engine; and the *largest* documents retained in the document
+        cache, by size.
+        """
+
+        retained = []
+        for entry in self.document_cache.entries.values():
+            retained.append({
+                "name": entry.name, "bytes": entry.size,
+                "elements": sum(1 for _ in entry.document.iter()),
+                "memo": len(entry.memo),
+            })
+        retained.sort(key=lambda item: item["bytes"], reverse=True)
+
+        return {
+            "document_cache": dict(
+                self.document_cache.stats(), parsed=self.parsed,
+                parsed_bytes=self.parsed_bytes, parse_time=self.parse_time,
+                elements=sum(item["elements"] for item in retained)),
+            "render_cache": self.render_cache.stats(),
+            "aeration_memo": {
+                "entries": len(self.aeration_memo),
+                "anchors": sum(aeration._anchor is not None
+                               for aeration in self.aeration_memo.values()),
+            },
+            "file_digest_memo": {"entries": len(self.file_digest_memo)},
+            "engines": {
+                "adjuster": self.adjuster.stats(),
+                "reformer": self.reformer.stats(),
+                "renderer": self.renderer.stats(),
+                "node_renderer": self.node_renderer.stats(),
+            },
+            "largest_documents": retained[:largest],
+        }
+
+    def trace(self, event, **args):
+        """
+        Return a context manager that records a span named *event* in the
+        instance's *tracer* (see :meth:`Tracer.span
+        <aerate.trace.Tracer.span>`), or that does nothing if it has none.
+        """
+
+        if self.tracer is None:
+            return nullcontext({})
+        return self.tracer.span(event, **args)
 
     def signal_document_used(self, name):
         for sentry in self.sentries:
             sentry.signal_document_used(name)
 
+    def signal_aeration_used(self, id):
+        for sentry in self.sentries:
+            sentry.signal_aeration_used(id)
+
+    def signal_render_used(self, key):
+        for sentry in self.sentries:
+            sentry.signal_render_used(key)
+
     def detect_used(self):
         """Return a `DocumentSentry` to observe the instance."""
         return DocumentSentry(self)
@@ -70,59 +281,65 @@ class Aerate:
     def find_member(self, name, kind=None):
         """Find and return the aeration of a member by *name* and *kind*."""
 
+        result = self.index.find_member(name, kind)
+
+        criteria = f"with name {name!r}"
         if kind is not None:
-            result = self.document.xpath(
-                ".//member[name/text()=$name and @kind=$kind]",
-                name=name,
-                kind=kind)
-        else:
-            result = self.document.xpath(
-                ".//member[name/text()=$name]",
-                name=name)
+            criteria += f" and kind {kind!r}"
 
         if not result:
-            raise LookupError(f"No <member> with name {name!r} in index.xml")
-        # TODO: handle this
-        return self[result[0].attrib["refid"]]
-
-    def canonical_node_by_id(self, id):
-        """Return the canonical <compound> or <member> node for an *id*."""
-
-        # Search for a <compound> or <member> node with a refid = id
-        result = self.document.xpath(
-            "//*[(self::compound or self::member) and @refid=$id]",
-            id=id)
+            raise LookupError(f"No <member> {criteria} in index.xml")
+        elif len(result) > 1:
+            raise LookupError(f"Multiple <member>s {criteria} in index.xml: "
+                              f"{', '.join(result)}")
+        return self[result[0]]
+
+    def find_compound(self, name, kind=None):
+        """
+        Find and return the aeration of a compound by *name* and *kind*.
+
+        The *name* may also be the refid of the compound, to tell apart
+        compounds with the same name (such as files with the same name in
+        different directories).
+        """
+
+        result = self.index.find_compound(name, kind)
+        if not result and name in self.index:
+            symbol = self.index[name]
+            if symbol.tag == "compound" and kind in (None, symbol.kind):
+                result = [name]
+
+        criteria = f"with name {name!r}"
+        if kind is not None:
+            criteria += f" and kind {kind!r}"
 
         if not result:
+            raise LookupError(f"No <compound> {criteria} in index.xml")
+        elif len(result) > 1:
+            raise LookupError(f"Multiple <compound>s {criteria} in "
+                              f"index.xml: {', '.join(result)}")
+        return self[result[0]]
+
+    def canonical_node_by_id(self, id):
+        """
+        Return the canonical <compound> or <member> node for an *id*.
+
+        The map from each id to its node is memoized in the ``index.xml``
+        entry in the :attr:`document_cache`, so that it's released along with
+        the document.
+        """
+
+        entry = self.load_entry("index.xml")
+        nodes = entry.memo.get("canonical_nodes")
+        if nodes is None:
+            with self.trace("canonical_node_by_id"):
+                nodes = entry.memo["canonical_nodes"] = canonical_nodes(
+                    entry.document)
+        try:
+            return nodes[id]
+        except KeyError:
             raise LookupError(f"No <compound> or <member> with refid {id!r} "
-                              "in index.xml")
-
-        # Return a unique result
-        if len(result) == 1:
-            return result[0]
-
-        # A <compound> should be unique in index.xml. If there are multiple
-        # results, then each should be a <member> with a <compound> parent. The
-        # canonical node is the one that's located inside of a <compound> with
-        # a refid that's a prefix of the <member>'s refid. If more than one
-        # <member> satisfies this requirement, then the one inside the
-        # <compound> with the longest refid is the canonical one. Two refids
-        # can't be the same length if both are a prefix of a <member>'s refid.
-        def is_canonical(node):
-            parent_id = node.getparent().attrib["refid"]
-            id = node.attrib["refid"]
-            return id.startswith(parent_id)
-        last_resort = result[0]
-        result = list(filter(is_canonical, result))
-
-        if len(result) == 1:
-            return result[0]
-        elif not result:
-            # If we can't find a canonical node with this criteria then return
-            # any node
-            return last_resort
-
-        return max(result, key=lambda node: len(node.getparent()["refid"]))
+                              "in index.xml") from None
 
 
 class DocumentSentry:
@@ -132,6 +349,12 @@ class DocumentSentry:
         self.aerate = aerate
         self.record = set()
 
+        # The id of each aeration retrieved from the instance
+        self.references = set()
+
+        # The key of each render cache entry used by the instance
+        self.renders = set()
+
     def __enter__(self):
         self.aerate.sentries.add(self)
         return self
@@ -141,3 +364,9 @@ class DocumentSentry:
 
     def signal_document_used(self, name):
         self.record.add(name)
+
+    def signal_aeration_used(self, id):
+        self.references.add(id)
+
+    def signal_render_used(self, key):
+        self.renders.add(key)
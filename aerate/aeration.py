@@ -1,12 +1,18 @@
+from aerate.cache import DocumentEntry
+from aerate.nodes import append_body
+from itertools import chain
+from lxml import etree
 from lxml.etree import Element, ElementTree
+import hashlib
 
 
 class Aeration:
     """
     An "aeration" is a documentable object (either a "compound" or a "member").
 
-    Each aeration is associated with a *node* from ``index.xml``. This will be
-    either a ``<compound>`` or a ``<member>``.
+    Each aeration is associated with a *symbol* from the symbol index of
+    ``index.xml`` and with the *node* that the symbol was taken from. This will
+    be either a ``<compound>`` or a ``<member>``.
 
     Each aeration is also associated with a "definition" node, or *matter*,
     from the XML file that it or its compound is documented in. This will be
@@ -14,24 +20,22 @@ class Aeration:
     """
 
     @staticmethod
-    def make(aerate, node):
+    def make(aerate, symbol):
         """
-        Make a `CompoundAeration` or `MemberAeration` from a *node*.
+        Make a `CompoundAeration` or `MemberAeration` from a *symbol*.
 
-        The *node* must be a ``<compound>`` or ``<member>`` node from
-        ``index.xml``.
+        The *symbol* must be from the symbol index of ``index.xml``.
         """
 
         return {
             "compound": CompoundAeration, "member": MemberAeration,
-        }[node.tag](aerate, node)
+        }[symbol.tag](aerate, symbol)
 
-    def __init__(self, aerate, node):
+    def __init__(self, aerate, symbol):
         self.aerate = aerate
+        self.symbol = symbol
 
         self._anchor = None
-        self._node = node
-        self._matter = None
 
     def __eq__(self, other):
         return self.id == other.id
@@ -46,17 +50,17 @@ class Aeration:
     @property
     def id(self) -> str:
         """Return the "refid" of the aeration."""
-        return self.node.attrib["refid"]
+        return self.symbol.id
 
     @property
     def name(self) -> str:
         """Return the name of the aeration."""
-        return self.node.find("name").text
+        return self.symbol.name
 
     @property
     def kind(self) -> str:
         """Return the "kind" of the aeration."""
-        return self.node.attrib["kind"]
+        return self.symbol.kind
 
     @property
     def anchor(self) -> str:
@@ -76,28 +80,171 @@ class Aeration:
         """
 
         if self._anchor is None:
-            evname = "aerate-generate-anchor"
-            anchor = self.sphinx.emit_firstresult(evname, self)
+            anchor = self.aerate.generate_anchor(self)
             self._anchor = anchor or self.name
         return self._anchor
 
     @property
     def node(self) -> Element:
         """Return the *node* of the aeration."""
-        return self._node
+        return self.aerate.canonical_node_by_id(self.id)
 
     @property
     def matter(self) -> Element:
-        """Memoize and return the *matter* of the aeration."""
-        if self._matter is None:
-            self._matter = self.retrieve_matter()
+        """
+        Return the *matter* of the aeration.
+
+        The *matter* isn't held by the aeration. Instead it's retrieved from
+        the aerate instance's document cache each time, so that it's released
+        when its document is evicted from the cache.
+        """
+
+        matter = self.retrieve_matter()
         self.signal_used()
-        return self._matter
+        return matter
+
+    @property
+    def filename(self) -> str:
+        """Return the name of the XML file that the aeration is defined in."""
+        raise NotImplementedError("must be implemented in a subclass")
+
+    @property
+    def entry(self) -> DocumentEntry:
+        """Return the cache entry of the aeration's definition file."""
+        return self.aerate.load_entry(self.filename)
+
+    def adjust(self, force=False) -> Element:
+        """
+        Adjust the aeration's *matter* and return it.
+
+        The *matter* is adjusted by the aerate instance's adjuster, then by its
+        reformer if it has any rules. This is recorded in the memo of the
+        definition file's cache entry along with the revision of each engine,
+        and the *matter* isn't adjusted again until either engine's rules
+        change. At that point, or if *force* is true, the definition file is
+        reloaded so that its original *matter* is adjusted again.
+
+        As adjusting a compound's *matter* adjusts each member in it as well,
+        each member is recorded as adjusted along with the compound.
+        """
+
+        adjuster, reformer = self.aerate.adjuster, self.aerate.reformer
+        revision = (adjuster, adjuster.revision, reformer, reformer.revision)
+
+        key = ("adjusted", self.id)
+        adjusted = self.entry.memo.get(key)
+        if adjusted == revision and not force:
+            return self.matter
+        if adjusted is not None:
+            self.aerate.document_cache.discard(self.filename)
+
+        # Record the digest of each definition that the matter is in or that's
+        # in the matter before any of them are changed
+        matter = self.matter
+        memo = self.entry.memo
+        for node in chain(matter.iterancestors("compounddef"),
+                          matter.iter("compounddef", "memberdef")):
+            if ("digest", node.get("id")) not in memo:
+                memo["digest", node.get("id")] = digest_node(node)
+
+        with self.aerate.trace("adjust", id=self.id):
+            self.aerate.adjust(matter)
+            if reformer.script:
+                self.aerate.reform(matter)
+
+        # Each <memberdef> in the matter is adjusted along with it
+        for node in matter.iter("memberdef"):
+            memo["adjusted", node.get("id")] = revision
+        memo[key] = revision
+        return matter
+
+    @property
+    def digest(self) -> str:
+        """
+        Return a digest of the aeration's original *matter*.
+
+        This is the SHA-256 digest of the canonical form of the *matter* as it
+        was in its definition file, before it was adjusted.
+        """
+
+        memo = self.entry.memo
+        if ("digest", self.id) not in memo:
+            memo["digest", self.id] = digest_node(self.matter)
+        return memo["digest", self.id]
 
     def render(self, *args, **kwargs):
         """Render the aeration's *matter*."""
         return self.aerate.render(self.matter, *args, **kwargs)
 
+    def describe(self, as_nodes=False):
+        """
+        Return the reST description of the aeration.
+
+        This is the rendered brief, detailed, and in body description of the
+        aeration's adjusted *matter*, separated by blank lines. If *as_nodes*
+        is true then it's instead a list of the docutils nodes rendered by the
+        aerate instance's node renderer, which needn't be parsed as reST.
+
+        The description is stored in the aerate instance's render cache, keyed
+        by the :attr:`digest` of the *matter* and the fingerprint of each of
+        the aerate instance's engines, along with the ``(kind, name, anchor)``
+        of each aeration that's referred to by the description. A stored
+        description is used unless one of these has since changed, in which
+        case the *matter* isn't adjusted or rendered at all.
+        """
+
+        aerate = self.aerate
+        fingerprint = aerate.fingerprint
+        if as_nodes:
+            fingerprint += f":{aerate.node_renderer.fingerprint}:nodes"
+        key = hashlib.sha256(
+            f"{self.digest}:{fingerprint}".encode()).hexdigest()
+        aerate.signal_render_used(key)
+
+        stored = aerate.render_cache.get(key)
+        if stored is not None:
+            references, output = stored
+            if all(aerate.resolve(id) == value
+                   for id, value in references.items()):
+                return output
+
+        matter = self.adjust()
+        with aerate.detect_used() as sentry, \
+                aerate.trace("render", id=self.id, as_nodes=as_nodes):
+            if as_nodes:
+                output = self.render_description_nodes(matter)
+            else:
+                output = self.render_description(matter)
+
+        references = {id: aerate.resolve(id) for id in sentry.references}
+        aerate.render_cache.put(key, (references, output))
+        return output
+
+    def render_description(self, matter) -> str:
+        """Return the reST description of the adjusted *matter*."""
+
+        output = ""
+        for prefix in ("brief", "detailed", "inbody"):
+            node = matter.find(f"{prefix}description")
+            if node is None:
+                continue
+            result = self.aerate.render(node, before=output)
+            if result:
+                output += ("\n\n" if output else "") + result
+        return output
+
+    def render_description_nodes(self, matter) -> list:
+        """Return the docutils nodes of the description of the *matter*."""
+
+        output = []
+        for prefix in ("brief", "detailed", "inbody"):
+            node = matter.find(f"{prefix}description")
+            if node is None:
+                continue
+            for result in self.aerate.render_nodes(node):
+                append_body(output, result)
+        return output
+
     def signal_used(self):
         """Signal to the aerate instance that the aeration was used."""
         raise NotImplementedError("must be implemented in a subclass")
@@ -108,22 +255,62 @@ class Aeration:
 
 
 class CompoundAeration(Aeration):
+    @property
+    def filename(self) -> str:
+        return f"{self.id}.xml"
+
     @property
     def document(self) -> ElementTree:
         """Return the XML document from the definition file of the compound."""
-        return self.aerate.load_document(f"{self.id}.xml")
+        return self.entry.document
 
     def signal_used(self):
-        self.aerate.signal_document_used(f"{self.id}.xml")
+        self.aerate.signal_document_used(self.filename)
+
+    def retrieve_memo(self):
+        """
+        Return the ``<compounddef>`` and ``<memberdef>``\\s of the compound.
+
+        This is a tuple of the compound's ``<compounddef>`` and a map from the
+        id of each ``<memberdef>`` in it to a list of each ``<memberdef>`` with
+        that id. It's memoized in the cache entry of the definition file.
+        """
+
+        entry = self.entry
+        key = ("compounddef", self.id)
+        if key in entry.memo:
+            return entry.memo[key]
+
+        with self.aerate.trace("retrieve_matter", id=self.id):
+            result = entry.document.xpath(
+                "//compounddef[@id=$id]", id=self.id)
+            if not result:
+                raise LookupError(f"No <compounddef> with id {self.id!r} in "
+                                  f"{self.id}.xml")
+            elif len(result) > 1:
+                raise LookupError(f"Multiple <compounddef>s with id "
+                                  f"{self.id!r} in {self.id}.xml")
+
+            memberdef_memo = {}
+            for node in result[0].iter("memberdef"):
+                memberdef_memo.setdefault(node.get("id"), []).append(node)
+
+        entry.memo[key] = (result[0], memberdef_memo)
+        return entry.memo[key]
 
     def retrieve_matter(self):
-        result = self.document.xpath("//compounddef[@id=$id]", id=self.id)
+        return self.retrieve_memo()[0]
+
+    def find_memberdef(self, id) -> Element:
+        """Return the ``<memberdef>`` with the *id* in the compound matter."""
+
+        result = self.retrieve_memo()[1].get(id, [])
         if not result:
-            raise LookupError(f"No <compounddef> with id {self.id!r} in "
+            raise LookupError(f"No <memberdef> with id {id!r} in "
                               f"{self.id}.xml")
         elif len(result) > 1:
-            raise LookupError(f"Multiple <compounddef>s with id {self.id!r} "
-                              f"in {self.id}.xml")
+            raise LookupError(f"Multiple <memberdef>s with id {id!r} in "
+                              f"{self.id}.xml")
         return result[0]
 
 
@@ -131,17 +318,20 @@ class MemberAeration(Aeration):
     @property
     def compound(self):
         """Return the compound aeration that this member is inside."""
-        return self.aerate[self.node.getparent().attrib["refid"]]
+        return self.aerate[self.symbol.parent]
+
+    @property
+    def filename(self) -> str:
+        return self.compound.filename
 
     def signal_used(self):
         self.compound.signal_used()
 
     def retrieve_matter(self):
-        result = self.compound.matter.xpath("//memberdef[@id=$id]", id=self.id)
-        if not result:
-            raise LookupError(f"No <memberdef> with id {self.id!r} in "
-                              f"{self.compound.id}.xml")
-        elif len(result) > 1:
-            raise LookupError(f"Multiple <memberdef>s with id {self.id!r} in "
-                              f"{self.compound.id}.xml")
-        return result[0]
+        return self.compound.find_memberdef(self.id)
+
+
+def digest_node(node) -> str:
+    """Return the SHA-256 digest of the canonical XML form of the *node*."""
+    text = etree.tostring(node, method="c14n2", with_tail=False)
+    return hashlib.sha256(text).hexdigest()
@@ -0,0 +1,289 @@
+from collections import OrderedDict
+import os
+import pickle
+import re
+
+__all__ = ("DocumentCache", "DocumentEntry", "RenderCache", "parse_cache_size")
+
+
+class DocumentEntry:
+    """
+    A parsed XML *document* in a :class:`DocumentCache`.
+
+    The *memo* of an entry is used to store anything derived from (and that
+    refers to nodes in) the *document*, so that it's discarded along with the
+    *document* when the entry is evicted.
+    """
+
+    __slots__ = ("name", "document", "size", "memo")
+
+    def __init__(self, name, document, size):
+        self.name = name
+        self.document = document
+        self.size = size
+        self.memo = {}
+
+
+class DocumentCache:
+    """
+    A least recently used cache of parsed XML documents.
+
+    The cache holds at most *documents* entries and, approximately, at most
+    *size* bytes of documents. The size of each document is measured by the
+    size of its XML file. Either limit may be ``None`` to disable it. The
+    most recently added entry is never evicted, even if it's larger than
+    *size* on its own.
+    """
+
+    def __init__(self, documents=None, size=None):
+        self.documents = documents
+        self.size = size
+
+        self.entries = OrderedDict()
+        self.total = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, name):
+        return name in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, name):
+        """Return the entry with the *name* or ``None`` if it isn't cached."""
+
+        entry = self.entries.get(name)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.entries.move_to_end(name)
+        return entry
+
+    def put(self, name, document, size=0):
+        """Add the *document* with the *name* and return its entry."""
+
+        if name in self.entries:
+            self.total -= self.entries.pop(name).size
+
+        entry = self.entries[name] = DocumentEntry(name, document, size)
+        self.total += size
+
+        while len(self.entries) > 1 and self.is_full():
+            _, evicted = self.entries.popitem(last=False)
+            self.total -= evicted.size
+            self.evictions += 1
+
+        return entry
+
+    def discard(self, name):
+        """Remove the entry with the *name* if it's cached."""
+        if name in self.entries:
+            self.total -= self.entries.pop(name).size
+
+    def is_full(self):
+        """Return whether the cache exceeds either of its limits."""
+
+        if self.documents is not None and len(self.entries) > self.documents:
+            return True
+        return self.size is not None and self.total > self.size
+
+    def stats(self):
+        """Return a dictionary of the cache's statistics."""
+        return {
+            "entries": len(self.entries), "bytes": self.total,
+            "hits": self.hits, "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class RenderCache:
+    """
+    A persistent cache of rendered output stored in the *root* directory.
+
+    Each value is stored with :mod:`pickle` in its own file named by its key,
+    which should be a hex digest of everything that the value depends on. As
+    each file is written to a temporary file that's then moved into place, a
+    cache can be shared by concurrent processes.
+
+    The cache holds at most *documents* entries and at most *size* bytes of
+    files. Either limit may be ``None`` to disable it, while a limit of ``0``
+    (or a *root* of ``None``) disables the cache entirely. When the cache is
+    full the least recently used entries (by the modification time of their
+    file, which is updated when an entry is retrieved) are evicted. This is
+    only done in the process that made the cache, not in a process forked from
+    it (such as a process in a parallel Sphinx build), so that the cache isn't
+    scanned by each process and so that the entries still in use can be
+    retained with :meth:`retain`.
+    """
+
+    # Increment this when the layout of a stored value changes
+    VERSION = 1
+
+    def __init__(self, root, documents=None, size=None):
+        self.root = root
+        self.documents = documents
+        self.size = size
+
+        # The number and total size of the stored entries, or None until the
+        # root is first scanned
+        self.count = None
+        self.total = None
+
+        # The process that evicts entries from the cache
+        self.pid = os.getpid()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        """Return whether the cache can hold any entry."""
+        if self.root is None:
+            return False
+        return self.documents != 0 and self.size != 0
+
+    def path(self, key):
+        """Return the path to the file that stores the entry with the *key*."""
+        return os.path.join(self.root, key[:2], f"{key}.pickle")
+
+    def get(self, key):
+        """Return the value with the *key* or ``None`` if it isn't cached."""
+
+        if not self.enabled:
+            return None
+
+        path = self.path(key)
+        try:
+            with open(path, "rb") as file:
+                version, value = pickle.load(file)
+            os.utime(path)
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError,
+                TypeError, AttributeError):
+            version = None
+
+        if version != self.VERSION:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """Store the *value* with the *key*."""
+
+        if not self.enabled:
+            return
+
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = f"{path}.{os.getpid()}"
+        with open(temporary, "wb") as file:
+            pickle.dump((self.VERSION, value), file, pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, path)
+
+        if os.getpid() != self.pid:
+            return
+
+        if self.count is None:
+            self.scan()
+        else:
+            self.count += 1
+            self.total += os.path.getsize(path)
+
+        if self.is_full():
+            self.evict()
+
+    def scan(self):
+        """
+        Return a list of ``(mtime, size, path)`` of each entry in the cache.
+
+        This also updates the cache's :attr:`count` and :attr:`total`.
+        """
+
+        result = []
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                if not name.endswith(".pickle"):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                result.append((stat.st_mtime, stat.st_size, path))
+
+        self.count = len(result)
+        self.total = sum(size for _, size, _ in result)
+        return result
+
+    def is_full(self):
+        """Return whether the cache exceeds either of its limits."""
+
+        if self.documents is not None and self.count > self.documents:
+            return True
+        return self.size is not None and self.total > self.size
+
+    def evict(self):
+        """Remove the least recently used entries until it isn't full."""
+
+        for _, size, path in sorted(self.scan()):
+            if not self.is_full():
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self.count -= 1
+            self.total -= size
+            self.evictions += 1
+
+    def retain(self, keys):
+        """
+        Mark each entry with a key in *keys* as used and evict other entries
+        if the cache is full.
+        """
+
+        if not self.enabled:
+            return
+
+        for key in keys:
+            try:
+                os.utime(self.path(key))
+            except OSError:
+                pass
+        self.evict()
+
+    def stats(self):
+        """Return a dictionary of the cache's statistics."""
+        return {
+            "hits": self.hits, "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+def parse_cache_size(value):
+    """
+    Return the ``(documents, size)`` limits of a document cache size *value*.
+
+    The *value* is either ``None`` for an unlimited cache, an :class:`int`
+    number of documents, or a string number of bytes with an optional ``K``,
+    ``M``, or ``G`` suffix (such as ``"512M"``).
+    """
+
+    if value is None:
+        return None, None
+
+    if isinstance(value, int):
+        return value, None
+
+    m = re.fullmatch(r"\s*(\d+)\s*([KMG]?)B?\s*", str(value), re.IGNORECASE)
+    if not m:
+        raise ValueError(f"invalid document cache size: {value!r}")
+    number, unit = m.groups()
+    return None, int(number) * 1024 ** " KMG".index(unit.upper() or " ")
@@ -0,0 +1,138 @@
+from aerate.aerate import Aerate
+from aerate.prewarm import shard
+from aerate.signature import DIRECTIVES, format_signature
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import os
+
+__all__ = ("convert", "convert_compound")
+
+# The aerate instance in a worker process
+worker = None
+
+# The kind of each compound with a directive (as autoaeratefile), which has
+# its description included
+COMPOUND_KINDS = ("file", "group")
+
+
+def convert_compound(aerate, ids):
+    """
+    Return the reST of a compound and of each member of it in *ids*.
+
+    The *ids* are the ids defined in the compound's definition file (as from
+    :func:`~aerate.prewarm.shard`). The description of a compound with a kind
+    in :data:`COMPOUND_KINDS` comes first (as in its directive), followed by
+    each member with a kind that has a directive in
+    :data:`~aerate.signature.DIRECTIVES`. Return a tuple of the name of the
+    compound's file, the reST (or ``None`` if neither the description nor any
+    member is included), and a list of the error raised by the compound or by
+    each member that couldn't be converted.
+    """
+
+    (compound,) = (aerate[id] for id in ids
+                   if aerate.index[id].tag == "compound")
+    members = [aerate[id] for id in ids
+               if aerate.index[id].tag == "member"
+               and aerate.index[id].kind in DIRECTIVES]
+
+    lines, errors = [], []
+    if compound.kind in COMPOUND_KINDS:
+        try:
+            description = compound.describe()
+        except Exception as error:
+            errors.append(f"{compound.name} ({compound.id}): {error}")
+        else:
+            if description:
+                lines += [""] + description.splitlines()
+
+    for member in members:
+        try:
+            signature = format_signature(member, member.matter)
+            description = member.describe()
+        except Exception as error:
+            errors.append(f"{member.name} ({member.id}): {error}")
+            continue
+
+        lines += ["", f".. c:{DIRECTIVES[member.kind]}:: {signature}"]
+        if description:
+            lines.append("")
+            lines.extend(f"   {line}" if line else ""
+                         for line in description.splitlines())
+
+    if not lines:
+        return f"{compound.id}.rst", None, errors
+
+    title = compound.name
+    text = "\n".join([title, "=" * len(title)] + lines) + "\n"
+    return f"{compound.id}.rst", text, errors
+
+
+def convert(aerate, output, workers=None):
+    """
+    Convert each compound in the *aerate* instance into a reST file.
+
+    Each compound is converted with :func:`convert_compound` in one of
+    *workers* processes (or :func:`os.cpu_count` if it's ``None``) and its file
+    is written in the *output* directory as soon as it's converted. A file
+    that's unchanged isn't written again. This is a generator of a tuple of
+    the path to each file, whether it was written, and a list of each error
+    from its compound.
+    """
+
+    os.makedirs(output, exist_ok=True)
+
+    cache = aerate.render_cache
+    initargs = (aerate.doxygen_root, aerate.cache_root, aerate.anchors,
+                (cache.documents, cache.size), cache.pid)
+    with ProcessPoolExecutor(workers, initializer=initialize,
+                             initargs=initargs) as executor:
+        futures = [executor.submit(convert_shard, ids)
+                   for ids in shard(aerate).values()]
+
+        for future in as_completed(futures):
+            name, text, errors = future.result()
+            if text is None:
+                if errors:
+                    yield None, False, errors
+                continue
+
+            path = os.path.join(output, name)
+            try:
+                with open(path, encoding="utf-8") as file:
+                    written = file.read() != text
+            except OSError:
+                written = True
+
+            if written:
+                with open(path, "w", encoding="utf-8") as file:
+                    file.write(text)
+            yield path, written, errors
+
+    # Only this process evicts entries from the render cache, once each worker
+    # is done with it
+    if cache.enabled:
+        cache.evict()
+
+
+def initialize(doxygen_root, cache_root, anchors, render_cache_limits,
+               render_cache_owner):
+    """
+    Make the aerate instance in a worker process.
+
+    Its render cache has the same ``(documents, size)`` limits as the render
+    cache in the main process, so that it's disabled in the worker if it's
+    disabled there. The main process (with the pid *render_cache_owner*) is
+    left as the one that evicts entries from it, so that the workers neither
+    scan the cache nor evict the entries that each other just stored.
+    """
+
+    global worker
+    worker = Aerate(doxygen_root, cache_root=cache_root,
+                    document_cache_size=2, anchors=anchors)
+    cache = worker.render_cache
+    cache.documents, cache.size = render_cache_limits
+    cache.pid = render_cache_owner
+
+
+def convert_shard(ids):
+    """Convert the compound with the *ids* in a worker process."""
+    return convert_compound(worker, ids)
@@ -1,6 +1,9 @@
+from aerate.writer import Writer
 from importlib.util import find_spec
+from types import CodeType
+import hashlib
 
-__all__ = ("Engine", "Rule")
+__all__ = ("Engine", "Rule", "WithinMatcher", "digest_code")
 
 
 class Engine:
@@ -11,27 +14,149 @@ class Engine:
     node an engine will search through this list in order until it finds a rule
     that accepts the node. It will then use this rule to handle the node,
     returning the result of the rule's action.
+
+    To avoid asking every rule in the list about every node, an engine keeps a
+    dispatch table from each tag to the rules that could accept a node with
+    that tag: those with that tag in their *tags* and those with no *tags* at
+    all, in the order of the list. The table is filled in as each tag is
+    encountered and cleared whenever a rule is inserted with :meth:`rule`.
+
+    The *revision* of an engine is incremented whenever a rule is inserted, so
+    that a result that depends on the engine's rules can be recorded along with
+    the revision that produced it. As a revision isn't comparable between
+    processes, the engine's :attr:`fingerprint` is used instead for a result
+    that's stored in between builds.
+
+    The use of each rule can be recorded in an
+    :class:`~aerate.profile.EngineProfile` with :meth:`instrument`. This is
+    done by a proxy of each rule in the dispatch table, so an engine without a
+    profile isn't slowed down at all.
+
+    The tags in the ancestor chain of each node that a rule with *within* is
+    asked about are found once with :meth:`ancestry` (from those of its
+    parent) and shared by every rule, for as long as the outermost call to
+    :meth:`invoke` is in progress.
     """
 
     def __init__(self, aerate):
         self.aerate = aerate
         self.script = []
+        self.dispatch = {}
+        self.revision = 0
+        self.profile = None
+
+        # The digest of the source of each recipe file loaded into the engine
+        self.recipes = []
+        self._fingerprint = (None, None)
+
+        # The ancestor chain of each node and the number of calls to invoke()
+        # in progress
+        self.ancestries = {}
+        self.invoking = 0
 
     def invoke(self, *args, **kwargs):
         """Invoke the engine to handle the *node*."""
 
         node = self.retrieve_node(*args, **kwargs)
 
-        for rule in self.iterrule(node):
-            result = rule(self, *args, **kwargs)
-            if result is NotImplemented:
-                continue
-            return result
-        return self.on_unaccepted(*args, **kwargs)
+        self.invoking += 1
+        try:
+            for rule in self.iterrule(node):
+                result = rule(self, *args, **kwargs)
+                if result is NotImplemented:
+                    continue
+                return result
+            return self.on_unaccepted(*args, **kwargs)
+        finally:
+            self.invoking -= 1
+            if not self.invoking:
+                self.ancestries.clear()
 
     def iterrule(self, node):
         """Return an iterator through each rule that will accept the *node*."""
-        return (rule for rule in self.script if rule.accept(node))
+
+        chain = None
+        for rule in self.candidates(node.tag):
+            if chain is None and rule.matcher is not None:
+                chain = self.ancestry(node)
+            if rule.accept(node, chain):
+                yield rule
+
+    def ancestry(self, node):
+        """Return a tuple of the tags in the *node*'s ancestor chain."""
+
+        try:
+            return self.ancestries[node]
+        except KeyError:
+            pass
+
+        parent = node.getparent()
+        if parent is None:
+            chain = ()
+        else:
+            chain = (parent.tag,) + self.ancestry(parent)
+        self.ancestries[node] = chain
+        return chain
+
+    def candidates(self, tag):
+        """Return a list of the rules that could accept a node with *tag*."""
+
+        try:
+            return self.dispatch[tag]
+        except KeyError:
+            pass
+
+        result = self.dispatch[tag] = [
+            rule for rule in self.script
+            if rule.tags is None or tag in rule.tags]
+        if self.profile is not None:
+            result[:] = map(self.profile.wrap, result)
+        return result
+
+    def instrument(self, profile):
+        """Record the use of each rule in the *profile* (or stop if None)."""
+        self.profile = profile
+        self.dispatch.clear()
+
+    @property
+    def fingerprint(self) -> str:
+        """
+        Return a digest of the engine's recipe files and rules.
+
+        This digest changes if the source of a recipe file loaded into the
+        engine changes or if the code or criteria of any of its rules changes.
+        The code of a function is digested with :func:`digest_code`, so that
+        the digest is the same in each process. A rule with a criteria (or
+        action) that isn't a function (or a string) is identified by its
+        :func:`repr`, which likely changes in between processes.
+        """
+
+        if self._fingerprint[0] == self.revision:
+            return self._fingerprint[1]
+
+        digest = hashlib.sha256()
+        for recipe in self.recipes:
+            digest.update(recipe)
+        for rule in self.script:
+            for part in (rule.action, rule.when, rule.unless):
+                code = getattr(part, "__code__", None)
+                if code is not None:
+                    digest_code(digest, code)
+                else:
+                    digest.update(repr(part).encode())
+            digest.update(repr((sorted(rule.tags or ()),
+                                sorted(rule.within or ()))).encode())
+
+        self._fingerprint = (self.revision, digest.hexdigest())
+        return self._fingerprint[1]
+
+    def stats(self):
+        """Return a dictionary of the engine's statistics."""
+        return {
+            "rules": len(self.script), "dispatch": len(self.dispatch),
+            "within_memo": sum(len(rule.matcher.memo) for rule in self.script
+                               if rule.matcher is not None),
+        }
 
     def on_unaccepted(self, *args, **kwargs):
         """Handle a *node* that isn't accepted by any rule in the engine."""
@@ -61,7 +186,10 @@ class Engine:
             def return_recursive(self, node, *args, **kwargs):
                 return "".join(self.invoke(item) for item in node)
         """
-        exec(find_spec(recipe).loader.get_code(recipe), {"engine": self})
+        loader = find_spec(recipe).loader
+        source = loader.get_source(recipe) or ""
+        self.recipes.append(hashlib.sha256(source.encode()).digest())
+        exec(loader.get_code(recipe), {"engine": self})
 
     def rule(self, *tags, before=None, within=None, **kwargs):
         """
@@ -128,11 +256,49 @@ class Engine:
         def decorator(action):
             rule = Rule(action, tags=tags, within=within, **kwargs)
             self.script.insert(i, rule)
+            self.dispatch.clear()
+            self.revision += 1
             return action
 
         return decorator(action) if action else decorator
 
 
+def digest_code(digest, code):
+    """
+    Update the *digest* with the bytecode, names, and constants of *code*.
+
+    Unlike :func:`marshal.dumps` (which writes a :class:`frozenset` constant
+    in the order of its hashes before Python 3.11) this doesn't depend on the
+    hash seed of the process, so each process has the same digest.
+    """
+
+    digest.update(code.co_code)
+    digest.update(getattr(code, "co_exceptiontable", b""))
+    digest.update(repr((code.co_name, code.co_names, code.co_varnames,
+                        code.co_freevars, code.co_cellvars)).encode())
+    for constant in code.co_consts:
+        digest_constant(digest, constant)
+
+
+def digest_constant(digest, value):
+    """Update the *digest* with the constant *value* of a code object."""
+
+    if isinstance(value, CodeType):
+        digest_code(digest, value)
+    elif isinstance(value, (tuple, frozenset)):
+        if isinstance(value, frozenset):
+            digest.update(b"frozenset(")
+            value = sorted(value, key=repr)
+        else:
+            digest.update(b"(")
+        for item in value:
+            digest_constant(digest, item)
+            digest.update(b",")
+        digest.update(b")")
+    else:
+        digest.update(repr(value).encode())
+
+
 class Rule:
     """An action with criteria to decide if it should be called on a node."""
 
@@ -151,6 +317,8 @@ class Rule:
         self.when = when
         self.unless = unless
 
+        self.matcher = WithinMatcher(within) if within is not None else None
+
     def __repr__(self):
         return f"<Rule {self.name} at {id(self):#x}>"
 
@@ -164,7 +332,7 @@ class Rule:
         """
         return getattr(self.action, "__name__", type(self.action).__name__)
 
-    def accept(self, node):
+    def accept(self, node, chain=None):
         """
         Return whether the rule should be called on the *node*.
 
@@ -195,19 +363,16 @@ class Rule:
 
         If some combination of these criteria are specified then the *node*
         isn't accepted unless all of them accept the *node*.
+
+        The tags in the *node*'s ancestor chain can be specified as *chain* if
+        they're already known.
         """
 
         if self.tags is not None and node.tag not in self.tags:
             return False
 
-        if self.within is not None:
-            for within in self.within:
-                ancestor_iter = node.iterancestors()
-                for name in within.split("/"):
-                    if not any(node.tag == name for node in ancestor_iter):
-                        break
-                else: break
-            else: return False
+        if self.matcher is not None and not self.matcher(node, chain):
+            return False
 
         if self.when is not None and not self.evaluate(self.when, node):
             return False
@@ -218,8 +383,96 @@ class Rule:
         return True
 
 
+class WithinMatcher:
+    """
+    A compiled form of a rule's *within* (see :meth:`Rule.accept`).
+
+    Each string in *within* is split into its sequence of tags once, when the
+    matcher is created. The result for a node depends only on the tags in its
+    ancestor chain, so it's memoized by that chain (which an engine finds once
+    for each node with :meth:`Engine.ancestry`).
+    """
+
+    # The maximum number of ancestor chains to memoize the result of
+    MEMO_SIZE = 4096
+
+    def __init__(self, within):
+        self.within = within
+        self.patterns = tuple(tuple(item.split("/")) for item in within)
+        self.memo = {}
+
+    def __call__(self, node, chain=None):
+        """
+        Return whether the *node* (with the tags in its ancestor chain in
+        *chain*, if they're already known) is accepted by the matcher.
+        """
+
+        if chain is None:
+            chain = tuple(ancestor.tag for ancestor in node.iterancestors())
+        try:
+            return self.memo[chain]
+        except KeyError:
+            pass
+
+        if len(self.memo) >= self.MEMO_SIZE:
+            self.memo.clear()
+        result = self.memo[chain] = self.match(chain)
+        return result
+
+    def match(self, chain):
+        """
+        Return whether any pattern is a subsequence of the tags in *chain*.
+
+        Each pattern is matched greedily, from the nearest ancestor outward,
+        and all of them are advanced together in a single pass through the
+        *chain*.
+        """
+
+        progress = [0] * len(self.patterns)
+        for tag in chain:
+            for i, pattern in enumerate(self.patterns):
+                if pattern[progress[i]] != tag:
+                    continue
+                progress[i] += 1
+                if progress[i] == len(pattern):
+                    return True
+        return False
+
+
 class Renderer(Engine):
-    """An engine that renders an unaccepted node as its text."""
+    """
+    An engine that renders a node as reST into its *writer*.
+
+    Each rule writes its output to the engine's *writer* (a
+    :class:`~aerate.writer.Writer`), rendering each child node into it with
+    :meth:`emit`. A rule can instead return a string to be written. An
+    unaccepted node is rendered as its text.
+    """
+
+    def __init__(self, aerate):
+        super().__init__(aerate)
+        self.writer = None
+
+    def invoke(self, node, *args, before="", **kwargs):
+        """
+        Render the *node* into a new writer and return its output.
+
+        The text *before* the node is used to decide how inline markup at the
+        start of the output is escaped.
+        """
+
+        writer, self.writer = self.writer, Writer(last=before[-1:])
+        try:
+            self.emit(node, *args, **kwargs)
+            return self.writer.getvalue()
+        finally:
+            self.writer = writer
+
+    def emit(self, node, *args, **kwargs):
+        """Render the *node* into the engine's writer."""
+        result = super().invoke(node, *args, **kwargs)
+        if result is not None:
+            self.writer.write(result)
 
     def on_unaccepted(self, node, *args, **kwargs):
         return node.xpath("string()")
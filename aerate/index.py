@@ -0,0 +1,422 @@
+from collections import namedtuple
+from collections.abc import Mapping
+import mmap
+import os
+import struct
+
+__all__ = ("MappedSymbolIndex", "Symbol", "SymbolIndex", "canonical_nodes")
+
+# A symbol is a documentable object from index.xml. Its *tag* is "compound" or
+# "member" and its *parent* is the refid of the <compound> that a member is
+# canonically located in (or None for a compound).
+Symbol = namedtuple("Symbol", ("id", "tag", "kind", "name", "parent"))
+
+
+class SymbolIndex:
+    """
+    A table of each symbol (a ``<compound>`` or ``<member>``) in ``index.xml``.
+
+    The index maps each refid to the :class:`Symbol` from its canonical node
+    (see :func:`canonical_nodes`) and the name and kind of each ``<member>``
+    and each ``<compound>`` to its refids (see :meth:`find_member` and
+    :meth:`find_compound`). As it doesn't refer to any XML node
+    an index can be stored with :meth:`dump` and restored with :meth:`load`.
+
+    A stored index is in a compact binary form that :meth:`load` maps into
+    memory rather than reads, so that processes that load the same index
+    (such as each process in a parallel Sphinx build) share it without parsing
+    or copying it. See :class:`MappedSymbolIndex` for the layout.
+    """
+
+    # Increment this when the layout of a stored index changes
+    VERSION = 3
+
+    @classmethod
+    def from_document(cls, document):
+        """Build an index in a single pass through the ``index.xml``."""
+
+        index = cls()
+        for id, node in canonical_nodes(document).items():
+            parent = None
+            if node.tag == "member":
+                parent = node.getparent().attrib["refid"]
+            index.add(Symbol(id, node.tag, node.attrib["kind"],
+                             node.findtext("name"), parent))
+        return index
+
+    @classmethod
+    def load(cls, path, digest):
+        """
+        Load the index stored at *path* by :meth:`dump`.
+
+        This is a :class:`MappedSymbolIndex` of the stored index. Return
+        ``None`` if the index can't be loaded (such as if it's truncated or
+        corrupt) or if it wasn't stored with the same *digest* and
+        :attr:`VERSION`.
+        """
+
+        try:
+            return MappedSymbolIndex(path, cls.VERSION, digest)
+        except (OSError, ValueError, TypeError, struct.error):
+            return None
+
+    def __init__(self):
+        self.symbols = {}
+
+        # The refids of each <member> by (name, kind) and by name alone in
+        # the order that each is first listed in index.xml
+        self.by_name_kind = {}
+        self.by_name = {}
+
+        # Likewise the refids of each <compound>
+        self.compounds_by_name_kind = {}
+        self.compounds_by_name = {}
+
+    def __contains__(self, id):
+        return id in self.symbols
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def __iter__(self):
+        return iter(self.symbols)
+
+    def __getitem__(self, id):
+        """Return the symbol with the *id*."""
+        try:
+            return self.symbols[id]
+        except KeyError:
+            raise LookupError(f"No <compound> or <member> with refid {id!r} "
+                              "in index.xml") from None
+
+    def add(self, symbol):
+        """Add the *symbol* to the index."""
+
+        self.symbols[symbol.id] = symbol
+        if symbol.tag == "member":
+            by_name_kind, by_name = self.by_name_kind, self.by_name
+        else:
+            by_name_kind = self.compounds_by_name_kind
+            by_name = self.compounds_by_name
+        by_name_kind.setdefault((symbol.name, symbol.kind), []).append(
+            symbol.id)
+        by_name.setdefault(symbol.name, []).append(symbol.id)
+
+    def dump(self, path, digest):
+        """
+        Store the index at *path* to be loaded with the same *digest*.
+
+        The index is written to a temporary file that's then moved to *path*
+        so that a concurrent :meth:`load` never sees a partial index.
+        """
+
+        strings = {}
+
+        def intern(string):
+            if string is None:
+                return NONE
+            return strings.setdefault(string, len(strings))
+
+        records = []
+        for symbol in self.symbols.values():
+            records.extend(intern(field) for field in symbol)
+
+        # The position of each symbol in order by its id, and of each member
+        # and each compound in order by its name and kind (and then by its
+        # position)
+        ids = list(self.symbols)
+        by_id = sorted(range(len(ids)), key=ids.__getitem__)
+        position = {id: i for i, id in enumerate(ids)}
+        by_member = [position[id] for _, refids in sorted(
+            self.by_name_kind.items()) for id in refids]
+        by_compound = [position[id] for _, refids in sorted(
+            self.compounds_by_name_kind.items()) for id in refids]
+
+        blob = bytearray()
+        offsets = [0]
+        for string in strings:
+            blob += string.encode()
+            offsets.append(len(blob))
+
+        encoded = digest.encode()
+        header = struct.pack(
+            HEADER, MAGIC, self.VERSION, len(ids), len(strings),
+            len(by_member), len(by_compound), len(encoded))
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = f"{path}.{os.getpid()}"
+        with open(temporary, "wb") as file:
+            file.write(header)
+            file.write(encoded + bytes(-len(encoded) % 4))
+            for table in (records, by_id, by_member, by_compound, offsets):
+                file.write(struct.pack(f"={len(table)}I", *table))
+            file.write(blob)
+        os.replace(temporary, path)
+
+    def find_member(self, name, kind=None):
+        """
+        Return a list of the refids of each ``<member>`` with the *name*.
+
+        If *kind* isn't ``None`` then only a ``<member>`` of that kind is
+        included. The list is empty if no ``<member>`` matches.
+        """
+
+        if kind is not None:
+            return self.by_name_kind.get((name, kind), [])
+        return self.by_name.get(name, [])
+
+    def find_compound(self, name, kind=None):
+        """Like :meth:`find_member` for the refids of each ``<compound>``."""
+
+        if kind is not None:
+            return self.compounds_by_name_kind.get((name, kind), [])
+        return self.compounds_by_name.get(name, [])
+
+
+# The layout of the header of a stored index. This is followed by the digest
+# (padded to a multiple of 4 bytes) and then the tables of MappedSymbolIndex,
+# which are in native byte order so that they can be used in place.
+MAGIC = b"AERATEIX"
+HEADER = "<8s6I"
+
+# The string index that represents None in a stored index
+NONE = 0xFFFFFFFF
+
+
+class MappedSymbolIndex:
+    """
+    A :class:`SymbolIndex` that's stored at *path* and mapped into memory.
+
+    This has the same interface as a :class:`SymbolIndex` except that it can't
+    be changed. After its header and digest the stored index consists of these
+    tables of unsigned 32 bit integers:
+
+    ``records``
+        The five fields of each :class:`Symbol` (in the order that each is
+        listed in ``index.xml``) as an index into the string table (or
+        :data:`NONE`).
+
+    ``by_id``
+        The position of each symbol in ``records`` in order by its id.
+
+    ``by_member``
+        The position of each ``<member>`` symbol in ``records`` in order by its
+        name and kind, and then by its position.
+
+    ``by_compound``
+        Likewise the position of each ``<compound>`` symbol.
+
+    ``offsets``
+        The offset of each string in the string table, followed by the length
+        of the string table.
+
+    The string table itself is the UTF-8 encoding of each string one after
+    another. Each lookup is a binary search of one of these tables.
+
+    If *version* or *digest* isn't ``None`` then the stored index must have
+    been stored with that version and digest. A :exc:`ValueError` is raised
+    if it wasn't, or if the stored index is truncated, before any of its
+    tables are used.
+    """
+
+    def __init__(self, path, version=None, digest=None):
+        with open(path, "rb") as file:
+            self.mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            header = struct.unpack_from(HEADER, self.mmap)
+            (magic, self.version, count, strings, members, compounds,
+             length) = header
+            if magic != MAGIC:
+                raise ValueError(f"{path!r} isn't a stored symbol index")
+            if version is not None and self.version != version:
+                raise ValueError(f"{path!r} is version {self.version}")
+
+            start = struct.calcsize(HEADER)
+            self.digest = self.mmap[start:start + length].decode()
+            if digest is not None and self.digest != digest:
+                raise ValueError(f"{path!r} has a different digest")
+            start += length + -length % 4
+
+            end = start + (count * 6 + members + compounds + strings + 1) * 4
+            if end > len(self.mmap) or (end - start) % 4:
+                raise ValueError(f"{path!r} is truncated")
+            tables = memoryview(self.mmap)[start:end].cast("I")
+            self.records = tables[:count * 5]
+            self.by_id = tables[count * 5:count * 6]
+            start = count * 6
+            self.by_member = tables[start:start + members]
+            start += members
+            self.by_compound = tables[start:start + compounds]
+            self.offsets = tables[start + compounds:]
+            self.strings = memoryview(self.mmap)[end:]
+            if self.offsets[-1] > len(self.strings):
+                raise ValueError(f"{path!r} is truncated")
+        except Exception:
+            self.close()
+            raise
+
+        self.symbols = MappedSymbols(self)
+
+    def __contains__(self, id):
+        return self.find(id) is not None
+
+    def __len__(self):
+        return len(self.by_id)
+
+    def __iter__(self):
+        return iter(self.symbols)
+
+    def __getitem__(self, id):
+        """Return the symbol with the *id*."""
+
+        position = self.find(id)
+        if position is None:
+            raise LookupError(f"No <compound> or <member> with refid {id!r} "
+                              "in index.xml")
+        return self.symbol(position)
+
+    def close(self):
+        """Release the memory map of the stored index."""
+
+        for name in ("records", "by_id", "by_member", "by_compound",
+                     "offsets", "strings"):
+            if hasattr(self, name):
+                getattr(self, name).release()
+        try:
+            self.mmap.close()
+        except BufferError:
+            pass
+
+    def string(self, i):
+        """Return the string with index *i* in the string table."""
+        if i == NONE:
+            return None
+        return str(self.strings[self.offsets[i]:self.offsets[i + 1]], "utf-8")
+
+    def field(self, position, field):
+        """Return the *field* of the symbol at *position* in ``records``."""
+        return self.string(self.records[position * 5 + field])
+
+    def symbol(self, position):
+        """Return the symbol at *position* in ``records``."""
+        return Symbol(*map(self.string,
+                           self.records[position * 5:position * 5 + 5]))
+
+    def find(self, id):
+        """Return the position of the symbol with the *id* or ``None``."""
+
+        lo, hi = 0, len(self.by_id)
+        while lo < hi:
+            middle = (lo + hi) // 2
+            if self.field(self.by_id[middle], 0) < id:
+                lo = middle + 1
+            else:
+                hi = middle
+        if lo < len(self.by_id) and self.field(self.by_id[lo], 0) == id:
+            return self.by_id[lo]
+        return None
+
+    def find_member(self, name, kind=None):
+        """
+        Return a list of the refids of each ``<member>`` with the *name*.
+
+        If *kind* isn't ``None`` then only a ``<member>`` of that kind is
+        included. The list is empty if no ``<member>`` matches.
+        """
+        return self.search(self.by_member, name, kind)
+
+    def find_compound(self, name, kind=None):
+        """Like :meth:`find_member` for the refids of each ``<compound>``."""
+        return self.search(self.by_compound, name, kind)
+
+    def search(self, table, name, kind=None):
+        """
+        Return a list of the refids of each symbol in *table* (which is in
+        order by name and kind) with the *name* (and *kind*).
+        """
+
+        def key(i):
+            position = table[i]
+            return (self.field(position, 3), self.field(position, 2))
+
+        # Find the first symbol with the name (and kind) in the table
+        target = (name, kind or "")
+        lo, hi = 0, len(table)
+        while lo < hi:
+            middle = (lo + hi) // 2
+            if key(middle) < target:
+                lo = middle + 1
+            else:
+                hi = middle
+
+        result = []
+        while lo < len(table) and key(lo)[0] == name:
+            if kind is not None and key(lo)[1] != kind:
+                break
+            result.append(table[lo])
+            lo += 1
+
+        return [self.field(position, 0) for position in sorted(result)]
+
+
+class MappedSymbols(Mapping):
+    """A read only map from each refid to its symbol in a mapped index."""
+
+    def __init__(self, index):
+        self.index = index
+
+    def __getitem__(self, id):
+        position = self.index.find(id)
+        if position is None:
+            raise KeyError(id)
+        return self.index.symbol(position)
+
+    def __iter__(self):
+        return (self.index.field(position, 0)
+                for position in range(len(self.index)))
+
+    def __len__(self):
+        return len(self.index)
+
+
+def canonical_nodes(document):
+    """
+    Return a map from each refid to its canonical node in the *document*.
+
+    A ``<compound>`` should be unique in ``index.xml``. If there are multiple
+    nodes with a refid, then each should be a ``<member>`` with a
+    ``<compound>`` parent. The canonical node is the one that's located inside
+    of a ``<compound>`` with a refid that's a prefix of the ``<member>``'s
+    refid. If more than one ``<member>`` satisfies this requirement, then the
+    one inside the ``<compound>`` with the longest refid is the canonical one.
+    Two refids can't be the same length if both are a prefix of a
+    ``<member>``'s refid. If no node satisfies this requirement then the first
+    node with the refid is used.
+
+    The map is built in a single pass through the *document* and is ordered by
+    the first node with each refid.
+    """
+
+    # For each refid this is the first node with that refid, then the best
+    # canonical node found so far and the length of its parent's refid
+    first = {}
+    best = {}
+
+    for node in document.iter("compound", "member"):
+        id = node.attrib["refid"]
+        first.setdefault(id, node)
+
+        if not is_canonical(node):
+            continue
+        length = len(node.getparent().get("refid", ""))
+        if id not in best or length > best[id][1]:
+            best[id] = (node, length)
+
+    return {id: best[id][0] if id in best else node
+            for id, node in first.items()}
+
+
+def is_canonical(node):
+    """Return whether the refid of *node*'s parent is a prefix of its own."""
+    return node.attrib["refid"].startswith(node.getparent().get("refid", ""))
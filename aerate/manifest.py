@@ -0,0 +1,148 @@
+__all__ = ("Manifest", "ReferenceGraph")
+
+
+class Manifest:
+    """
+    A record of what aerate used to generate a single Sphinx document.
+
+    This records each ``(name, kind)`` that was looked up in the symbol index
+    (as a member or as a compound) along with the id of the aeration that it
+    resolved to (or ``None`` if it didn't resolve to one), and the id of each
+    aeration that was documented along with the name and digest of its
+    definition file and the :attr:`~aerate.aeration.Aeration.digest` of its
+    matter. The key of each
+    entry in the render cache that the document used is recorded as well, so
+    that these entries can be retained in the cache.
+
+    It's stored in the Sphinx environment in between builds so that a document
+    is only read again when something that it used has changed (see
+    :meth:`is_outdated`).
+    """
+
+    __slots__ = ("lookups", "compound_lookups", "definitions", "renders")
+
+    def __init__(self):
+        self.lookups = {}
+        self.compound_lookups = {}
+        self.definitions = {}
+        self.renders = set()
+
+    def record_lookup(self, name, kind, aeration):
+        """Record that *name* and *kind* resolved to the *aeration*."""
+        self.lookups[name, kind] = None if aeration is None else aeration.id
+
+    def record_compound_lookup(self, name, kind, aeration):
+        """Like :meth:`record_lookup` for the lookup of a compound."""
+        self.compound_lookups[name, kind] = (
+            None if aeration is None else aeration.id)
+
+    def record_definition(self, aeration):
+        """Record that the *aeration*'s matter was used."""
+        filename = aeration.filename
+        self.definitions[aeration.id] = (
+            filename, aeration.aerate.file_digest(filename), aeration.digest)
+
+    def record_render(self, key):
+        """Record that the render cache entry with the *key* was used."""
+        self.renders.add(key)
+
+    def is_outdated(self, aerate) -> bool:
+        """
+        Return whether anything recorded has changed in the *aerate* instance.
+
+        A definition file with the same digest hasn't changed. Otherwise the
+        file is loaded to compare the digest of each aeration's matter, so that
+        a change elsewhere in the file doesn't outdate the document.
+        """
+
+        for lookups, find in ((self.lookups, aerate.find_member),
+                              (self.compound_lookups, aerate.find_compound)):
+            for (name, kind), id in lookups.items():
+                try:
+                    found = find(name, kind=kind).id
+                except LookupError:
+                    found = None
+                if found != id:
+                    return True
+
+        for id, (filename, file_digest, digest) in self.definitions.items():
+            try:
+                if aerate.file_digest(filename) == file_digest:
+                    continue
+                aeration = aerate[id]
+                if (aeration.filename, aeration.digest) != (filename, digest):
+                    return True
+            except (LookupError, OSError):
+                return True
+
+        return False
+
+
+class ReferenceGraph:
+    """
+    A reverse graph from each aeration to the documents that refer to it.
+
+    For the id of each aeration that was retrieved while a document was
+    generated (such as the target of a ``<ref>`` in a description) this
+    records the document along with the ``(kind, name, anchor)`` that the id
+    resolved to at the time (see :meth:`Aerate.resolve
+    <aerate.aerate.Aerate.resolve>`). As the rendered output of a document
+    depends on these, the document is outdated when any of them change, even
+    if the document never loaded the target's definition file.
+
+    Each value is interned, so that a value recorded for many documents (such
+    as from many parallel processes) is only stored once.
+    """
+
+    def __init__(self):
+        # The documents that referred to each id and what it resolved to
+        self.referrers = {}
+
+        # The ids that each document referred to
+        self.references = {}
+
+        # The interned copy of each value
+        self.values = {}
+
+    def record(self, docname, id, value):
+        """Record that the *docname* referred to the *id* as the *value*."""
+        value = self.values.setdefault(value, value)
+        self.referrers.setdefault(id, {})[docname] = value
+        self.references.setdefault(docname, set()).add(id)
+
+    def purge(self, docname):
+        """Remove each reference from the *docname*."""
+
+        for id in self.references.pop(docname, ()):
+            referrers = self.referrers[id]
+            del referrers[docname]
+            if not referrers:
+                del self.referrers[id]
+
+        # Drop each interned value once there are many more than are used
+        if len(self.values) > 2 * len(self.referrers) + 64:
+            used = {value for referrers in self.referrers.values()
+                    for value in referrers.values()}
+            self.values = {value: value for value in used}
+
+    def merge(self, other, docnames):
+        """Add each reference from the *docnames* in the *other* graph."""
+
+        for docname in docnames:
+            for id in other.references.get(docname, ()):
+                self.record(docname, id, other.referrers[id][docname])
+
+    def find_outdated(self, aerate):
+        """
+        Return a set of each document that's outdated in the *aerate* instance.
+
+        Each id is only resolved once, no matter how many documents refer to
+        it.
+        """
+
+        result = set()
+        for id, referrers in self.referrers.items():
+            value = aerate.resolve(id)
+            result.update(docname for docname, stored in referrers.items()
+                          if stored != value)
+        return result
@@ -1,15 +1,33 @@
 from __future__ import annotations
 from aerate.engine import Engine
+from itertools import islice
 
 __all__ = ("MutationCursor", "MutationEngine")
 
 
 class MutationCursor:
-    """A cursor through an XML element tree that supports mutation."""
+    """
+    A cursor through an XML element tree that supports mutation.
+
+    The cursor tracks its *depth* below its root as it moves, so that whether
+    it's still inside the root's subtree can be decided without walking the
+    ancestors of its node. This includes the mutations that remove the
+    cursor's node (and so advance the cursor) as only the nodes in the removed
+    subtree change their depth. When it can't be tracked (after the cursor is
+    moved to an arbitrary node, or after a mutation that may have moved the
+    cursor's node) the depth is measured again when it's next needed.
+    """
 
-    def __init__(self, root):
+    def __init__(self, root, on_mutate=None):
         self._root = root
-        self.node = root
+        self._node = root
+
+        # The depth of the cursor's node below the root, -1 if the node isn't
+        # in the root's subtree, or None if it's unknown
+        self._depth = 0
+
+        # Called with no arguments whenever the cursor mutates the tree
+        self.on_mutate = on_mutate
 
     def __bool__(self):
         return self.node is not None
@@ -19,40 +37,126 @@ class MutationCursor:
         """Return the root node of the cursor that it can't escape."""
         return self._root
 
+    @property
+    def node(self):
+        """Return the node that the cursor is on."""
+        return self._node
+
+    @node.setter
+    def node(self, node):
+        self._node = node
+        self._depth = None
+
+    @property
+    def depth(self) -> int:
+        """
+        Return the depth of the cursor's node below its root.
+
+        This is ``0`` on the root itself and ``-1`` if the cursor's node isn't
+        the root or a descendant of the root.
+        """
+
+        if self._depth is None:
+            self._depth = self.measure(self._node)
+        return self._depth
+
+    def measure(self, node) -> int:
+        """Return the depth of the ``node`` below the cursor's root."""
+
+        if node is None:
+            return -1
+        if node is self._root:
+            return 0
+        for depth, ancestor in enumerate(node.iterancestors(), 1):
+            if ancestor is self._root:
+                return depth
+        return -1
+
+    def is_inside(self) -> bool:
+        """Return whether the cursor is on its root or a descendant of it."""
+        return self._node is not None and self.depth >= 0
+
+    def is_below(self, node) -> bool:
+        """
+        Return whether the ``node`` is an ancestor of the cursor's node.
+
+        When the cursor is inside its root only the ancestors up to the root
+        (as many as its :attr:`depth`) can be the ``node``.
+        """
+
+        if node is self._node or node.getparent() is self._node:
+            return False
+
+        depth = self.depth
+        if depth < 0:
+            ancestors = self._node.iterancestors()
+        elif node is self._root:
+            return depth > 0
+        else:
+            ancestors = islice(self._node.iterancestors(), max(depth - 1, 0))
+        return any(ancestor is node for ancestor in ancestors)
+
     def move_to(self, node) -> MutationCursor:
         """Move the cursor to the ``node``."""
         self.node = node
         return self
 
+    def move_by(self, node, change) -> MutationCursor:
+        """
+        Move the cursor to the ``node`` that's ``change`` levels deeper.
+
+        This is used when the ``node`` is known to be ``change`` levels deeper
+        (or shallower if it's negative) than the cursor's node, so that its
+        depth below the root can be tracked without measuring it.
+        """
+
+        depth = self._depth
+        if depth is not None and depth >= 0:
+            depth += change
+            if depth < 0 or depth == 0 and node is not self._root:
+                depth = -1
+        else:
+            depth = None
+
+        self._node = node
+        self._depth = depth
+        return self
+
     def next(self) -> MutationCursor:
         """Move the cursor to the next node in sequence."""
 
         try:
-            return self.move_to(self.node[0])
+            return self.move_by(self.node[0], 1)
         except IndexError:
             return self.skip()
 
     def rewind(self) -> MutationCursor:
         if self.node.getprevious() is not None:
-            return self.move_to(self.node.getprevious())
-        return self.move_to(self.node.getparent())
+            return self.move_by(self.node.getprevious(), 0)
+        return self.move_by(self.node.getparent(), -1)
 
     def skip(self) -> MutationCursor:
         """Skip the cursor's node."""
 
         if self.node.getnext() is not None:
-            return self.move_to(self.node.getnext())
+            return self.move_by(self.node.getnext(), 0)
 
-        for ancestor in self.node.iterancestors():
+        for change, ancestor in enumerate(self.node.iterancestors(), 1):
             if ancestor.getnext() is not None:
-                return self.move_to(ancestor.getnext())
+                return self.move_by(ancestor.getnext(), -change)
 
         return self.stop()
 
     def stop(self) -> MutationCursor:
-        self.node = None
+        self._node = None
+        self._depth = -1
         return self
 
+    def mutated(self):
+        """Signal that the cursor has mutated the tree."""
+        if self.on_mutate is not None:
+            self.on_mutate()
+
     def adjoin(self, node=None, to=None):
         """
         Join the node to its previous sibling node.
@@ -75,9 +179,16 @@ class MutationCursor:
 
         to.extend(node.iterchildren())
 
-        if node == self.node or node in set(self.node.iterancestors()):
+        # As the node has no children now, the cursor is advanced out of it
+        if node is self.node or self.is_below(node):
             self.next()
+
+        # A node that was in the node's subtree has the depth of the target's
+        # children now
+        if to.getparent() is not node.getparent():
+            self._depth = None
         node.getparent().remove(node)
+        self.mutated()
         return self
 
     def divide(self, node=None):
@@ -126,6 +237,7 @@ class MutationCursor:
 
         continuation.extend([node] + list(node.itersiblings()))
         parent.addnext(continuation)
+        self.mutated()
 
         return self
 
@@ -170,6 +282,7 @@ class MutationCursor:
         node.tail = None
         continuation.extend(node.itersiblings())
         parent.addnext(continuation)
+        self.mutated()
 
         return self
 
@@ -226,6 +339,14 @@ class MutationCursor:
             parent.addnext(continuation)
         parent.addnext(node)
 
+        # Unless the node is the cursor's node or a child of it, the cursor may
+        # be in the subtree that was lifted
+        if node is self.node and self._depth is not None:
+            self.move_by(node, -1)
+        elif parent is not self.node:
+            self._depth = None
+        self.mutated()
+
         return self
 
     def remove(self, node=None):
@@ -272,8 +393,18 @@ class MutationCursor:
 
         node = node if node is not None else self.node
 
-        if node == self.node or node in set(self.node.iterancestors()):
+        # The cursor is still in the removed subtree if it's advanced to a
+        # child of the node (and so deeper than the node); otherwise its depth
+        # doesn't change
+        if node is self.node:
+            depth = self._depth
             self.next()
+            if depth is not None and depth >= 0 \
+                    and self._depth is not None and self._depth > depth:
+                self._depth = -1
+        elif self.is_below(node):
+            self.next()
+            self._depth = None
 
         # Retain the node's tail
         if node.getprevious() is not None:
@@ -282,6 +413,7 @@ class MutationCursor:
             extend_text(node.getparent(), node.tail)
 
         node.getparent().remove(node)
+        self.mutated()
 
         return self
 
@@ -313,14 +445,40 @@ def extend_tail(node, string):
 
 
 class MutationEngine(Engine):
-    """An engine used to mutate a node tree."""
+    """
+    An engine used to mutate a node tree.
+
+    When a rule returns the cursor on the same node, the node is handled again
+    by the next rule that accepts it (rather than by the same rule again). To
+    do this the engine memoizes, for each node it has handled, its progress
+    through the rules that could accept it. This progress is only valid for
+    the *version* of the tree that it was recorded in: whenever a cursor from
+    :meth:`cursor` mutates the tree the version is incremented, and a node
+    handled again in a later version starts over at its first rule. The memo
+    only lasts for a single call to :meth:`handle`. Likewise the ancestor
+    chain of each node is forgotten whenever the tree is mutated.
+    """
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.memo = {}
+        self.version = 0
+
+        # The number of calls to handle() in progress
+        self.handling = 0
 
     def iterrule(self, node):
-        return self.memo.setdefault(node, super().iterrule(node))
+        progress = self.memo.get(node)
+        if progress is None or progress[0] != self.version:
+            progress = self.memo[node] = [self.version, 0]
+
+        rules = self.candidates(node.tag)
+        while progress[1] < len(rules):
+            rule = rules[progress[1]]
+            progress[1] += 1
+            if rule.accept(node, self.ancestry(node)
+                           if rule.matcher is not None else None):
+                yield rule
 
     def on_unaccepted(self, cursor, *args, **kwargs):
         return cursor.next()
@@ -328,7 +486,22 @@ class MutationEngine(Engine):
     def retrieve_node(self, cursor, *args, **kwargs):
         return cursor.node
 
+    def touch(self):
+        """Increment the version of the tree after it's mutated."""
+        self.version += 1
+        self.ancestries.clear()
+
+    def cursor(self, root):
+        """Return a cursor on *root* that increments the engine's version."""
+        return MutationCursor(root, on_mutate=self.touch)
+
     def handle(self, root):
-        cursor = MutationCursor(root)
-        while cursor and (root == cursor.node or root in cursor.node.iterancestors()):
-            self.invoke(cursor)
+        self.handling += 1
+        try:
+            cursor = self.cursor(root)
+            while cursor.is_inside():
+                self.invoke(cursor)
+        finally:
+            self.handling -= 1
+            if not self.handling:
+                self.memo.clear()
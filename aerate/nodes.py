@@ -0,0 +1,143 @@
+from aerate.engine import Engine
+from docutils import nodes
+from sphinx import addnodes
+
+__all__ = (
+    "NodeRenderer", "add_function_parentheses", "append_body",
+    "strip_paragraph", "xref",
+)
+
+# The role of the C domain used to refer to each kind of aeration
+ROLES = {"function": "func", "define": "macro", "typedef": "type"}
+
+
+class NodeRenderer(Engine):
+    """
+    An engine that renders a node as a list of docutils nodes.
+
+    Unlike the :class:`~aerate.engine.Renderer` the result isn't parsed again
+    as reST, so the text in it is never escaped. Each rule's result includes
+    the node's tail (as the result of an inline rule in the renderer does),
+    and an unaccepted node is rendered as its text.
+    """
+
+    def on_unaccepted(self, node, *args, **kwargs):
+        return [nodes.Text(node.xpath("string()") + (node.tail or ""))]
+
+    def render_inline(self, node):
+        """
+        Return a list of the docutils nodes of the text and the inline content
+        of the *node* (but not its tail).
+        """
+
+        output = [nodes.Text(node.text)] if node.text else []
+        for item in node:
+            output.extend(self.invoke(item))
+        return output
+
+    def render_blocks(self, node):
+        """
+        Return a list of the docutils nodes of the content of the *node*.
+
+        Each run of text and inline nodes is put in a paragraph, in between
+        the body elements that the structural content is rendered as.
+        """
+
+        output = []
+        paragraph = nodes.paragraph()
+
+        def close():
+            nonlocal paragraph
+            if paragraph.astext().strip():
+                output.append(strip_paragraph(paragraph))
+            paragraph = nodes.paragraph()
+
+        if node.text:
+            paragraph += nodes.Text(node.text)
+        for item in node:
+            for result in self.invoke(item):
+                if isinstance(result, (nodes.Text, nodes.Inline)):
+                    paragraph += result
+                else:
+                    close()
+                    append_body(output, result)
+        close()
+        return output
+
+
+def append_body(output, node):
+    """
+    Append the body element *node* to the *output* list.
+
+    A field list is combined with a field list right before it, so that each
+    field in a description is in a single field list (as it'd be in reST).
+    """
+
+    if isinstance(node, nodes.field_list) and output \
+            and isinstance(output[-1], nodes.field_list):
+        output[-1].extend(node.children)
+    else:
+        output.append(node)
+
+
+def strip_paragraph(paragraph):
+    """Strip the whitespace at the start and end of the *paragraph*."""
+
+    for index, strip in ((0, str.lstrip), (-1, str.rstrip)):
+        if isinstance(paragraph[index], nodes.Text):
+            text = strip(paragraph[index].astext())
+            if text:
+                paragraph[index] = nodes.Text(text)
+            else:
+                del paragraph[index]
+    return paragraph
+
+
+def xref(aeration, text):
+    """
+    Return a ``pending_xref`` to the *aeration* in the C domain with *text*.
+
+    The text is handled as in a C domain role, except that the parentheses
+    after the name of a function aren't added here. Instead the reference is
+    marked so that :func:`add_function_parentheses` adds them when the nodes
+    are inserted into a document, as the result may be stored in between
+    builds with a different ``add_function_parentheses``. Return ``None`` if
+    there's no role for the aeration's kind.
+    """
+
+    role = ROLES.get(aeration.kind)
+    if role is None:
+        return None
+
+    target = aeration.anchor
+    if role == "func":
+        explicit = text not in {target, f"{target}()"}
+    else:
+        explicit = text != target
+    if role == "func" and not explicit:
+        text = target
+
+    inside = nodes.literal(text, text, classes=["xref", "c", f"c-{role}"])
+    result = addnodes.pending_xref(
+        "", inside, refdomain="c", reftype=role, reftarget=target,
+        refexplicit=explicit, refwarn=False)
+    if role == "func" and not explicit:
+        result["aerate_parentheses"] = True
+    return result
+
+
+def add_function_parentheses(output, config):
+    """
+    Add parentheses after the name of each function that's referred to in the
+    *output* nodes (from :func:`xref`) if ``add_function_parentheses`` is true
+    in the *config*.
+    """
+
+    for node in output:
+        for result in node.traverse(addnodes.pending_xref):
+            if not result.attributes.pop("aerate_parentheses", False):
+                continue
+            if config.add_function_parentheses:
+                text = result[0].astext() + "()"
+                result[0] = nodes.literal(text, text,
+                                          classes=result[0]["classes"])
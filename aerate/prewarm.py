@@ -0,0 +1,134 @@
+from aerate.aerate import Aerate
+from aerate.trace import Tracer
+from concurrent.futures import ProcessPoolExecutor
+import os
+
+__all__ = ("prewarm", "shard")
+
+# The aerate instance in a worker process, the fingerprint that its engines
+# must have for its output to be used by the parent process, and whether it
+# renders each description as docutils nodes
+worker = None
+expected = None
+as_nodes = False
+
+
+def shard(aerate):
+    """
+    Return a map from each definition file to the ids defined in it.
+
+    Each aeration in the symbol index of the *aerate* instance is included. The
+    map is ordered from the largest definition file to the smallest, and each
+    ``<member>`` comes before the ``<compound>`` in each list (as adjusting a
+    compound's matter adjusts the matter of each member in it as well).
+    """
+
+    result = {}
+    for id in aerate.index.symbols:
+        result.setdefault(aerate[id].filename, []).append(id)
+    for ids in result.values():
+        ids.sort(key=lambda id: aerate.index[id].tag == "compound")
+
+    def size(filename):
+        try:
+            return os.path.getsize(os.path.join(aerate.doxygen_root, filename))
+        except OSError:
+            return 0
+
+    return {filename: result[filename]
+            for filename in sorted(result, key=size, reverse=True)}
+
+
+def prewarm(aerate, workers=None, nodes=False):
+    """
+    Fill the render cache of the *aerate* instance on a pool of processes.
+
+    Each aeration in the symbol index is described (adjusted and rendered) in
+    one of *workers* processes (or :func:`os.cpu_count` if it's ``None``), and
+    the aerations in each definition file are described in the same process so
+    that each file is only loaded once. The render cache is stored in the
+    *aerate* instance's cache root and shared with the workers, so that each
+    description is put into the cache by its worker directly.
+
+    A worker can't use the "aerate-generate-anchor" event, so the anchor of
+    each ``<member>`` is generated here and sent to each worker. If a worker's
+    output depends on a different anchor anyway (or if its engines have a
+    different fingerprint) then the stored description isn't used. Return a
+    tuple of the number of aerations described and the number that failed.
+
+    If *nodes* is true then each description is rendered as docutils nodes
+    (as by ``describe(as_nodes=True)``) rather than as reST.
+
+    If the *aerate* instance has a tracer then each worker records its spans
+    into the same directory.
+
+    Nothing is done if the *aerate* instance's render cache isn't enabled.
+    """
+
+    if not aerate.render_cache.enabled:
+        return 0, 0
+
+    anchors = {}
+    for id, symbol in aerate.index.symbols.items():
+        if symbol.tag == "member" and aerate[id].anchor != symbol.name:
+            anchors[id] = aerate[id].anchor
+
+    shards = shard(aerate)
+    count, failed = 0, 0
+
+    trace_root = None if aerate.tracer is None else aerate.tracer.root
+    fingerprint = aerate.fingerprint
+    if nodes:
+        fingerprint += f":{aerate.node_renderer.fingerprint}"
+    initargs = (aerate.doxygen_root, aerate.cache_root, anchors, fingerprint,
+                trace_root, nodes)
+    with ProcessPoolExecutor(workers, initializer=initialize,
+                             initargs=initargs) as executor:
+        for result in executor.map(describe, shards.values()):
+            count += result[0]
+            failed += result[1]
+
+    # The workers don't limit the size of the render cache
+    aerate.render_cache.evict()
+    return count, failed
+
+
+def initialize(doxygen_root, cache_root, anchors, fingerprint,
+               trace_root=None, nodes=False):
+    """Make the aerate instance in a worker process."""
+
+    global worker, expected, as_nodes
+    worker = Aerate(doxygen_root, cache_root=cache_root,
+                    document_cache_size=2, anchors=anchors)
+    if trace_root is not None:
+        worker.tracer = Tracer(trace_root, "prewarm")
+    expected = fingerprint
+    as_nodes = nodes
+
+
+def describe(ids):
+    """
+    Describe each aeration with an id in *ids* in a worker process.
+
+    Return a tuple of the number of aerations described and the number that
+    failed.
+    """
+
+    fingerprint = worker.fingerprint
+    if as_nodes:
+        fingerprint += f":{worker.node_renderer.fingerprint}"
+    if fingerprint != expected:
+        return 0, len(ids)
+
+    failed = 0
+    with worker.trace("prewarm", file=worker[ids[0]].filename):
+        for id in ids:
+            # An error is raised again (and reported) when the aeration is
+            # documented, so it's only counted here
+            try:
+                worker[id].describe(as_nodes=as_nodes)
+            except Exception:
+                failed += 1
+    if worker.tracer is not None:
+        worker.tracer.flush()
+    return len(ids) - failed, failed
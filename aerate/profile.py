@@ -0,0 +1,210 @@
+import os
+import time
+import weakref
+
+__all__ = ("EngineProfile", "Profiler", "ProfiledRule")
+
+# The statistics recorded for each rule name, in the order of a stats list
+FIELDS = (
+    "evaluated", "accepted", "invoked", "declined", "accept_time", "time",
+    "self_time",
+)
+EVALUATED, ACCEPTED, INVOKED, DECLINED, ACCEPT_TIME, TIME, SELF_TIME = range(
+    len(FIELDS))
+
+# Each profiler that's cleared in a forked process
+PROFILERS = weakref.WeakSet()
+
+
+def clear_profilers():
+    """Clear each profiler (in a process that was just forked)."""
+    for profiler in list(PROFILERS):
+        profiler.clear()
+
+
+os.register_at_fork(after_in_child=clear_profilers)
+
+
+class Profiler:
+    """
+    A record of the use of each rule in a set of engines.
+
+    For each rule name in each engine this counts the evaluations of the rule's
+    :meth:`~aerate.engine.Rule.accept`, the nodes that it accepted, the
+    invocations of its action, and the invocations that returned
+    ``NotImplemented`` (falling through to the next rule). It measures the
+    wall time spent in the rule's :meth:`~aerate.engine.Rule.accept` and in
+    its action, both in total and excluding the time spent in other rules (as
+    a rule in the renderer usually invokes the renderer on each child node).
+
+    The profiler is cleared in a process forked from the one that made it, so
+    that what's recorded in a process in a parallel Sphinx build can be
+    merged back into the main process without counting anything twice.
+    """
+
+    def __init__(self):
+        self.engines = {}
+
+        # The time spent in other rules by each action in progress
+        self.stack = []
+
+        PROFILERS.add(self)
+
+    def __getstate__(self):
+        return {"engines": self.engines}
+
+    def __setstate__(self, state):
+        self.__init__()
+        self.engines = state["engines"]
+        for profile in self.engines.values():
+            profile.profiler = self
+
+    def instrument(self, name, engine):
+        """Record the use of each rule in the *engine* as *name*."""
+
+        profile = self.engines.get(name)
+        if profile is None:
+            profile = self.engines[name] = EngineProfile(self)
+        engine.instrument(profile)
+
+    def attach(self, aerate):
+        """Record the use of each rule in each engine of the *aerate*."""
+        for name in ("adjuster", "reformer", "renderer", "node_renderer"):
+            self.instrument(name, getattr(aerate, name))
+
+    def clear(self):
+        """Reset each statistic recorded in the profiler to zero."""
+        for profile in self.engines.values():
+            profile.clear()
+        self.stack.clear()
+
+    def merge(self, other):
+        """Add each statistic recorded in the *other* profiler."""
+        for name, profile in other.engines.items():
+            if name not in self.engines:
+                self.engines[name] = EngineProfile(self)
+            self.engines[name].merge(profile)
+
+    def as_dict(self):
+        """Return a map from each engine to the statistics of its rules."""
+        return {name: profile.as_dict()
+                for name, profile in self.engines.items()}
+
+    def report(self, limit=10):
+        """
+        Return a list of lines that summarize the *limit* rules in each engine
+        that took the most time (excluding other rules).
+        """
+
+        lines = []
+        for name, profile in self.engines.items():
+            stats = profile.as_dict()
+            if not stats:
+                continue
+            lines.append(f"{name}: {len(stats)} rules")
+            top = sorted(stats.items(), reverse=True,
+                         key=lambda item: item[1]["self_time"])
+            for rule, item in top[:limit]:
+                lines.append(
+                    f"  {rule:32} {item['self_time']:9.3f} s self "
+                    f"{item['time']:9.3f} s total "
+                    f"{item['invoked']:8} invoked "
+                    f"{item['declined']:8} declined "
+                    f"{item['accepted']:8}/{item['evaluated']} accepted")
+        return lines
+
+
+class EngineProfile:
+    """The statistics of each rule name in a single engine."""
+
+    def __init__(self, profiler):
+        self.profiler = profiler
+
+        # A map from each rule name to its list of statistics (see FIELDS)
+        self.stats = {}
+
+    def __getstate__(self):
+        return {"stats": self.stats}
+
+    def __setstate__(self, state):
+        self.profiler = None
+        self.stats = state["stats"]
+
+    def wrap(self, rule):
+        """Return a proxy of the *rule* that records its use."""
+
+        stats = self.stats.get(rule.name)
+        if stats is None:
+            stats = self.stats[rule.name] = [0] * len(FIELDS)
+        return ProfiledRule(rule, stats, self.profiler.stack)
+
+    def clear(self):
+        for stats in self.stats.values():
+            stats[:] = [0] * len(FIELDS)
+
+    def merge(self, other):
+        for name, stats in other.stats.items():
+            into = self.stats.setdefault(name, [0] * len(FIELDS))
+            into[:] = [a + b for a, b in zip(into, stats)]
+
+    def as_dict(self):
+        return {name: dict(zip(FIELDS, stats))
+                for name, stats in self.stats.items()}
+
+
+class ProfiledRule:
+    """
+    A proxy of a :class:`~aerate.engine.Rule` that records its use.
+
+    The statistics are recorded into *stats* (which is shared by each rule
+    with the same name), and the time of each nested rule is added to the
+    last item in *stack*.
+    """
+
+    __slots__ = ("rule", "stats", "stack")
+
+    def __init__(self, rule, stats, stack):
+        self.rule = rule
+        self.stats = stats
+        self.stack = stack
+
+    def __getattr__(self, name):
+        return getattr(self.rule, name)
+
+    def __repr__(self):
+        return repr(self.rule)
+
+    def accept(self, node, chain=None):
+        start = time.perf_counter()
+        result = self.rule.accept(node, chain)
+        elapsed = time.perf_counter() - start
+
+        stats = self.stats
+        stats[EVALUATED] += 1
+        stats[ACCEPT_TIME] += elapsed
+        if result:
+            stats[ACCEPTED] += 1
+        if self.stack:
+            self.stack[-1] += elapsed
+        return result
+
+    def __call__(self, *args, **kwargs):
+        stack = self.stack
+        stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            result = self.rule(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            nested = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+
+            stats = self.stats
+            stats[INVOKED] += 1
+            stats[TIME] += elapsed
+            stats[SELF_TIME] += elapsed - nested
+
+        if result is NotImplemented:
+            stats[DECLINED] += 1
+        return result
@@ -90,6 +90,9 @@ def absorb_compatible_simplesect(self, cursor):
 def divide_para_by_type(self, cursor):
     """Divide a ``para`` node with both structural and inline markup."""
 
+    if not len(cursor.node):
+        return cursor
+
     if cursor.node.text or is_inline(cursor.node[0]):
         is_simple = True
     elif is_structural(cursor.node[0]):
@@ -139,9 +142,8 @@ def remove_null_para(self, cursor):
     """Remove a ``para`` node with no text or children."""
 
     if len(cursor.node):
-        from aerate.mutation import MutationCursor
-        subcursor = MutationCursor(cursor.node[0])
-        while subcursor and cursor.node in subcursor.node.iterancestors():
+        subcursor = self.cursor(cursor.node).next()
+        while subcursor.depth > 0:
             self.invoke(subcursor)
 
     if cursor.node.text or len(cursor.node):
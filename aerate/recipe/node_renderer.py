@@ -0,0 +1,163 @@
+from aerate.nodes import NodeRenderer, append_body, xref
+from aerate.schema import (
+    DESCRIPTION_TAGS, SchemaError, is_inline, is_structural,
+)
+from docutils import nodes
+from sphinx import addnodes
+import re
+
+engine: NodeRenderer = engine  # Stop "F821 undefined name 'engine'"
+
+
+# The simplesect's kind must be "see", "return", "author", "authors",
+# "version", "since", "date", "note", "warning", "pre", "post", "copyright",
+# "invariant", "remark", "attention", "par", or "rcs"
+
+@engine.rule("simplesect", when=lambda node: node.get("kind") == "return")
+def render_simplesect_return(self, node):
+    body = nodes.field_body("", *render_simplesect(self, node))
+    return [nodes.field_list("", nodes.field(
+        "", nodes.field_name("", "return"), body))]
+
+
+@engine.rule("simplesect", when=lambda node: node.get("kind") in {
+    "attention", "note", "warning"})
+def render_simplesect_admonition(self, node):
+    admonition = getattr(nodes, node.get("kind"))
+    return [admonition("", *render_simplesect(self, node))]
+
+
+@engine.rule("simplesect", when=lambda node: node.get("kind") == "remark")
+def render_simplesect_remark(self, node):
+    title = nodes.title("Remark", "Remark")
+    return [nodes.admonition("", title, *render_simplesect(self, node),
+                             classes=["admonition-remark"])]
+
+
+@engine.rule("simplesect", when=lambda node: node.get("kind") == "see")
+def render_simplesect_see(self, node):
+    return [addnodes.seealso("", *render_simplesect(self, node))]
+
+
+@engine.rule("simplesect", when=lambda node: node.get("kind") == "par")
+def render_simplesect_par(self, node):
+    text = node.xpath("./title/text()")[0]
+    title = nodes.title(text, text)
+    return [nodes.admonition("", title, *render_simplesect(self, node),
+                             classes=["admonition-" + nodes.make_id(text)])]
+
+
+@engine.rule("simplesect")
+def render_simplesect(self, node):
+    output = []
+    for para in node.iterchildren("para"):
+        for item in self.invoke(para):
+            append_body(output, item)
+    return output
+
+
+def render_text_ref(self, node):
+    return [nodes.literal(node.text, node.text), nodes.Text(node.tail or "")]
+
+
+@engine.rule("ref", within="para", when=lambda node: node.get("external"))
+def render_ref_external(self, node):
+    return render_text_ref(self, node)
+
+
+@engine.rule("ref", within="para")
+def render_ref(self, node):
+    try:
+        target = self.aerate[node.attrib["refid"]]
+    except LookupError:
+        return render_text_ref(self, node)
+
+    result = xref(target, node.text)
+    if result is None:
+        return render_text_ref(self, node)
+    return [result, nodes.Text(node.tail or "")]
+
+
+@engine.rule("programlisting")
+def render_programlisting(self, node):
+    text = "\n".join(item.xpath("string()") for item in node)
+    return [nodes.literal_block(text, text, language="c")]
+
+
+@engine.rule("ulink")
+def render_ulink(self, node):
+    inside = self.render_inline(node)
+    return [nodes.reference("", *inside, refuri=node.attrib["url"]),
+            nodes.Text(node.tail or "")]
+
+
+@engine.rule("bold", "emphasis", "computeroutput", "subscript",
+             "superscript")
+def render_inline_markup(self, node):
+    markup = {
+        "bold": nodes.strong, "emphasis": nodes.emphasis,
+        "computeroutput": nodes.literal, "subscript": nodes.subscript,
+        "superscript": nodes.superscript,
+    }[node.tag]
+    return [markup("", *self.render_inline(node)),
+            nodes.Text(node.tail or "")]
+
+
+@engine.rule("formula", when=lambda node: is_structural(node))
+def render_structural_formula(self, node):
+    assert not node.tail, "structural node in <para> shouldn't have tail text"
+    return [nodes.math_block(node.text, node.text, nowrap=True, number=None,
+                             label=None)]
+
+
+@engine.rule("formula", when=lambda node: is_inline(node))
+def render_inline_formula(self, node):
+    # Trim $ from the node text
+    text = re.sub(r"^\s*\$\s*", "", node.text)
+    text = re.sub(r"\s*\$\s*$", "", text)
+    return [nodes.math(text, text), nodes.Text(node.tail or "")]
+
+
+@engine.rule("listitem", within="itemizedlist")
+def render_listitem(self, node):
+    for item in node:
+        if item.tag != "para":
+            raise SchemaError(f"Can't handle <{item.tag}> in <{node.tag}>")
+    return [nodes.list_item("", *self.render_blocks(node))]
+
+
+@engine.rule("itemizedlist")
+def render_itemizedlist(self, node):
+    output = nodes.bullet_list(bullet="-")
+    for item in node:
+        output.extend(self.invoke(item))
+    return [output]
+
+
+@engine.rule("para")
+def render_para(self, node):
+    return self.render_blocks(node)
+
+
+@engine.rule("parameterlist", when=lambda node: node.get("kind") == "param")
+def render_parameterlist(self, node):
+    output = nodes.field_list()
+    for item in node.xpath("./parameteritem"):
+        (name,) = item.xpath("./parameternamelist/parametername[1]/text()")
+        (description_node,) = item.xpath("./parameterdescription")
+
+        body = nodes.field_body("", *self.invoke(description_node))
+        output += nodes.field(
+            "", nodes.field_name("", f"param {name}"), body)
+    return [output]
+
+
+@engine.rule(*DESCRIPTION_TAGS)
+def render_description(self, node):
+    output = []
+    for item in node:
+        if item.tag != "para":
+            raise SchemaError(f"Can't handle <{item.tag}> in <{node.tag}>")
+        for result in self.invoke(item):
+            append_body(output, result)
+    return output
@@ -7,7 +7,6 @@ from aerate.render import (
     math_renderer, computeroutput_renderer, subscript_renderer,
     superscript_renderer, xref_func_renderer, xref_macro_renderer)
 import re
-import textwrap
 
 engine: Renderer = engine  # Stop "F821 undefined name 'engine'"
 
@@ -17,231 +16,219 @@ engine: Renderer = engine  # Stop "F821 undefined name 'engine'"
 # "invariant", "remark", "attention", "par", or "rcs"
 
 @engine.rule("simplesect", when=lambda node: node.get("kind") == "return")
-def render_simplesect_return(self, node, before=""):
+def render_simplesect_return(self, node):
     prefix = ":return: "
-    output = render_simplesect(self, node, before)
-    output = textwrap.indent(output, " " * len(prefix)).strip()
-    return prefix + output + "\n\n"
+    self.writer.write(prefix)
+    with self.writer.indent(" " * len(prefix)), self.writer.stripped():
+        render_simplesect(self, node)
+    self.writer.write("\n\n")
+
+
+def render_directive(self, node, prefix):
+    self.writer.write(prefix + "\n\n")
+    with self.writer.indent(" " * 3):
+        render_simplesect(self, node)
+    self.writer.write("\n\n")
 
 
 @engine.rule("simplesect", when=lambda node: node.get("kind") in {
     "attention", "note", "warning"})
-def render_simplesect_admonition(self, node, before=""):
-    prefix = f".. {node.get('kind')}::"
-    output = render_simplesect(self, node, before)
-    output = textwrap.indent(output, " " * 3)
-    return prefix + "\n\n" + output + "\n\n"
+def render_simplesect_admonition(self, node):
+    render_directive(self, node, f".. {node.get('kind')}::")
 
 
 @engine.rule("simplesect", when=lambda node: node.get("kind") == "remark")
-def render_simplesect_remark(self, node, before=""):
-    prefix = f".. admonition:: Remark"
-    output = render_simplesect(self, node, before)
-    output = textwrap.indent(output, " " * 3)
-    return prefix + "\n\n" + output + "\n\n"
+def render_simplesect_remark(self, node):
+    render_directive(self, node, ".. admonition:: Remark")
 
 
 @engine.rule("simplesect", when=lambda node: node.get("kind") == "see")
-def render_simplesect_see(self, node, before=""):
-    prefix = ".. seealso::"
-    output = render_simplesect(self, node, before)
-    output = textwrap.indent(output, " " * 3)
-    return prefix + "\n\n" + output + "\n\n"
+def render_simplesect_see(self, node):
+    render_directive(self, node, ".. seealso::")
 
 
 @engine.rule("simplesect", when=lambda node: node.get("kind") == "par")
-def render_simplesect_par(self, node, before=""):
-    prefix = ".. admonition:: " + node.xpath("./title/text()")[0]
-    output = render_simplesect(self, node, before)
-    output = textwrap.indent(output, " " * 3)
-    return prefix + "\n\n" + output + "\n\n"
+def render_simplesect_par(self, node):
+    title = node.xpath("./title/text()")[0]
+    render_directive(self, node, ".. admonition:: " + title)
 
 
 @engine.rule("simplesect")
-def render_simplesect(self, node, before=""):
-    output = "\n\n".join(
-        self.invoke(para) for para in node.iterchildren("para")
-    ) + "\n\n"
-    return output
+def render_simplesect(self, node):
+    for index, para in enumerate(node.iterchildren("para")):
+        if index:
+            self.writer.write("\n\n")
+        self.emit(para)
+    self.writer.write("\n\n")
 
 
 @engine.rule("ref", within="para", when=lambda node: node.get("external"))
-def render_ref_external(self, node, before=""):
-    return f"`!{node.text}`{node.tail or ''}"
+def render_ref_external(self, node):
+    self.writer.write(f"`!{node.text}`{node.tail or ''}")
 
 
 @engine.rule("ref", within="para")
-def render_ref(self, node, before=""):
+def render_ref(self, node):
     refid = node.attrib["refid"]
     try:
         target = self.aerate[refid]
     except LookupError:
-        return f"`!{node.text}`{node.tail or ''}"
+        self.writer.write(f"`!{node.text}`{node.tail or ''}")
+        return
 
+    before = self.writer.last
     if target.kind == "function":
         if node.text in {target.anchor, f"{target.anchor}()"}:
             inside = node.text
         else:
             inside = f"{node.text} <{target.anchor}>"
-        return xref_func_renderer.render_text(inside, node.tail, before)
+        output = xref_func_renderer.render_text(inside, node.tail, before)
     elif target.kind == "define":
         if node.text == target.anchor:
             inside = node.text
         else:
             inside = f"{node.text} <{target.anchor}>"
-        return xref_macro_renderer.render_text(inside, node.tail, before)
+        output = xref_macro_renderer.render_text(inside, node.tail, before)
     elif target.kind == "typedef":
         if target.name == node.text:
-            return f":c:type:`{target.name}`{node.tail or ''}"
+            output = f":c:type:`{target.name}`{node.tail or ''}"
         else:
-            return f":c:type:`{node.text} <{target.name}>`{node.tail or ''}"
-
-    return f"`!{node.text}`{node.tail or ''}"
+            output = f":c:type:`{node.text} <{target.name}>`{node.tail or ''}"
+    else:
+        output = f"`!{node.text}`{node.tail or ''}"
+    self.writer.write(output)
 
 
 @engine.rule("programlisting")
-def render_programlisting(self, node, before=""):
-    prefix = ".. code-block:: c\n\n"
-    output = "\n".join(self.invoke(item) for item in node)
-    return prefix + textwrap.indent(output, " " * 3)
+def render_programlisting(self, node):
+    self.writer.write(".. code-block:: c\n\n")
+    with self.writer.indent(" " * 3):
+        for index, item in enumerate(node):
+            if index:
+                self.writer.write("\n")
+            self.emit(item)
 
 
 @engine.rule("ulink")
-def render_ulink(self, node, before=""):
-    return ulink_renderer.render(node, before)
+def render_ulink(self, node):
+    self.writer.write(ulink_renderer.render(node, self.writer.last))
 
 
 @engine.rule("bold")
-def render_bold(self, node, before=""):
-    return bold_renderer.render(node, before)
+def render_bold(self, node):
+    self.writer.write(bold_renderer.render(node, self.writer.last))
 
 
 @engine.rule("emphasis")
-def render_emphasis(self, node, before=""):
-    return emphasis_renderer.render(node, before)
+def render_emphasis(self, node):
+    self.writer.write(emphasis_renderer.render(node, self.writer.last))
 
 
 @engine.rule("computeroutput")
-def render_computeroutput(self, node, before=""):
-    return computeroutput_renderer.render(node, before)
+def render_computeroutput(self, node):
+    self.writer.write(computeroutput_renderer.render(node, self.writer.last))
 
 
 @engine.rule("subscript")
-def render_subscript(self, node, before=""):
-    return subscript_renderer.render(node, before)
+def render_subscript(self, node):
+    self.writer.write(subscript_renderer.render(node, self.writer.last))
 
 
 @engine.rule("superscript")
-def render_superscript(self, node, before=""):
-    return superscript_renderer.render(node, before)
+def render_superscript(self, node):
+    self.writer.write(superscript_renderer.render(node, self.writer.last))
 
 
 @engine.rule("formula", when=lambda node: is_structural(node))
-def render_structural_formula(self, node, before=""):
+def render_structural_formula(self, node):
     assert not node.tail, "structural node in <para> shouldn't have tail text"
-    prefix = ".. math::\n   :nowrap:\n\n"
-    return prefix + textwrap.indent(node.text, " " * 3)
+    self.writer.write(".. math::\n   :nowrap:\n\n")
+    with self.writer.indent(" " * 3):
+        self.writer.write(node.text)
 
 
 @engine.rule("formula", when=lambda node: is_inline(node))
-def render_inline_formula(self, node, before=""):
+def render_inline_formula(self, node):
     render_text = math_renderer.render_text
 
     # Trim $ from the node text
     text = re.sub(r"^\s*\$\s*", "", node.text)
     text = re.sub(r"\s*\$\s*$", "", text)
-    return render_text(text, node.tail, before=before)
+    self.writer.write(render_text(text, node.tail, before=self.writer.last))
 
 
 @engine.rule("listitem", within="itemizedlist")
-def render_listitem(self, node, before=""):
-    output = escape_text(node.text or "")
-    for item in node:
-        if item.tag != "para":
-            raise SchemaError(f"Can't handle <{item.tag}> in <{node.tag}>")
-        output += self.invoke(item, before=output or "- ")
-    output = textwrap.indent(output, " " * 2).strip()
-    return f"- {output}\n"
+def render_listitem(self, node):
+    self.writer.write("- ")
+    with self.writer.indent(" " * 2), self.writer.stripped():
+        self.writer.write(escape_text(node.text or ""))
+        for item in node:
+            if item.tag != "para":
+                raise SchemaError(f"Can't handle <{item.tag}> in <{node.tag}>")
+            self.emit(item)
+    self.writer.write("\n")
 
 @engine.rule("itemizedlist")
-def render_itemizedlist(self, node, before=""):
-    output = escape_text(node.text or "")
+def render_itemizedlist(self, node):
+    self.writer.write(escape_text(node.text or ""))
     for item in node:
-        output += self.invoke(item, before=output)
-    return output + "\n"
+        self.emit(item)
+    self.writer.write("\n")
 
 @engine.rule("para")
-def render_para(self, node, before=""):
-    output = escape_text(node.text or "")
+def render_para(self, node):
+    # Inline markup is escaped by what's before it in the same paragraph
+    self.writer.last = ""
+    self.writer.write(escape_text(node.text or ""))
     for item in node:
-        output += self.invoke(item, before=output)
-    return output + "\n\n"
+        self.emit(item)
+    self.writer.write("\n\n")
 
 
 @engine.rule("parameterlist", when=lambda node: node.get("kind") == "param")
-def render_parameterlist(self, node, before=""):
-    buffer = ""
+def render_parameterlist(self, node):
     for item in node.xpath("./parameteritem"):
         (name,) = item.xpath("./parameternamelist/parametername[1]/text()")
         (description_node,) = item.xpath("./parameterdescription")
 
-        output = f":param {name}: "
-        description_output = self.invoke(description_node, before=output)
-
-        output += textwrap.indent(description_output, " " * len(output)).strip()
-        buffer += "\n" + output
-    return buffer + "\n\n"
+        prefix = f":param {name}: "
+        self.writer.write("\n" + prefix)
+        with self.writer.indent(" " * len(prefix)), self.writer.stripped():
+            self.emit(description_node)
+    self.writer.write("\n\n")
 
 
 @engine.rule(*DESCRIPTION_TAGS)
-def render_description(self, node, before=""):
-    output = []
-    for item in node:
+def render_description(self, node):
+    for index, item in enumerate(node):
         if item.tag != "para":
             raise SchemaError(f"Can't handle <{item.tag}> in <{node.tag}>")
-        output.append(self.invoke(item).rstrip())
-    return "\n\n".join(output)
+        if index:
+            self.writer.write("\n\n")
+        with self.writer.stripped(leading=False):
+            self.emit(item)
+
+
+def render_definition(self, node, signature):
+    self.writer.write(f".. c:{signature}\n\n")
+    for tag in ("briefdescription", "detaileddescription",
+                "inbodydescription"):
+        (description,) = node.xpath(f"./{tag}")
+        with self.writer.indent(" " * 3):
+            self.emit(description)
+        self.writer.write("\n\n")
 
 
 @engine.rule("memberdef", when=lambda node: node.get("kind") == "function")
-def render_function_definition(self, node, buffer=""):
+def render_function_definition(self, node):
     (definition,) = node.xpath("./definition")
     (argsstring,) = node.xpath("./argsstring")
-
-    output = f".. c:function:: {definition.text}{argsstring.text}\n\n"
-
-    (briefdescription,) = node.xpath("./briefdescription")
-    description_output = self.invoke(briefdescription)
-    output += textwrap.indent(description_output, " " * 3) + "\n\n"
-
-    (detaileddescription,) = node.xpath("./detaileddescription")
-    description_output = self.invoke(detaileddescription)
-    output += textwrap.indent(description_output, " " * 3) + "\n\n"
-
-    (inbodydescription,) = node.xpath("./inbodydescription")
-    description_output = self.invoke(inbodydescription)
-    output += textwrap.indent(description_output, " " * 3) + "\n\n"
-
-    return output
+    render_definition(
+        self, node, f"function:: {definition.text}{argsstring.text}")
 
 
 @engine.rule("memberdef", when=lambda node: node.get("kind") == "typedef")
-def render_typedef_definition(self, node, buffer=""):
+def render_typedef_definition(self, node):
     (type_node,) = node.xpath("./type")
     (name_node,) = node.xpath("./name")
-
-    output = f".. c:type:: {type_node.text} {name_node.text}\n\n"
-
-    (briefdescription,) = node.xpath("./briefdescription")
-    description_output = self.invoke(briefdescription)
-    output += textwrap.indent(description_output, " " * 3) + "\n\n"
-
-    (detaileddescription,) = node.xpath("./detaileddescription")
-    description_output = self.invoke(detaileddescription)
-    output += textwrap.indent(description_output, " " * 3) + "\n\n"
-
-    (inbodydescription,) = node.xpath("./inbodydescription")
-    description_output = self.invoke(inbodydescription)
-    output += textwrap.indent(description_output, " " * 3) + "\n\n"
-
-    return output
+    render_definition(self, node, f"type:: {type_node.text} {name_node.text}")
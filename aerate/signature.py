@@ -0,0 +1,39 @@
+__all__ = ("DIRECTIVES", "format_signature")
+
+# The directive in the C domain used to document each kind of aeration
+DIRECTIVES = {
+    "function": "function", "define": "macro", "typedef": "type",
+    "struct": "struct",
+}
+
+
+def format_function(aeration, matter) -> str:
+    type_text = matter.xpath("string(./type)")
+    (argsstring_node,) = matter.xpath("./argsstring")
+    return f"{type_text} {aeration.anchor}{argsstring_node.text}"
+
+
+def format_define(aeration, matter) -> str:
+    namelist = matter.xpath("./param/defname[1]/text()")
+    if not namelist:
+        return aeration.anchor
+    return f"{aeration.anchor}({', '.join(namelist)})"
+
+
+def format_typedef(aeration, matter) -> str:
+    (type_node,) = matter.xpath("./type")
+    (name_node,) = matter.xpath("./name")
+    return type_node.text + name_node.text
+
+
+def format_signature(aeration, matter) -> str:
+    """
+    Return the signature of the *aeration* to use in its directive line.
+
+    The *matter* is the aeration's matter (which needn't be adjusted).
+    """
+
+    return {
+        "function": format_function, "define": format_define,
+        "typedef": format_typedef, "struct": format_typedef,
+    }[aeration.kind](aeration, matter)
@@ -1,12 +1,23 @@
 from aerate.aerate import Aerate, Aeration
+from aerate.manifest import Manifest, ReferenceGraph
+from aerate.nodes import add_function_parentheses
+from aerate.prewarm import prewarm
+from aerate.profile import Profiler
+from aerate.signature import DIRECTIVES, format_signature
+from aerate.trace import Tracer, merge
 from sphinx.ext.autodoc import Documenter
 from sphinx.util import logging
+from sphinx.util.docutils import SphinxDirective
 from typing import Any, Tuple, List
+import glob
+import itertools
+import json
 import os
 
 __all__ = (
     "FunctionDocumenter", "MacroDocumenter", "TypeDocumenter",
-    "StructDocumenter")
+    "StructDocumenter", "FileDocumenter", "GroupDocumenter",
+    "DescriptionDirective")
 
 logger = logging.getLogger(__name__)
 
@@ -29,92 +40,483 @@ class AerationDocumenter(Documenter):
     @property
     def aerate(self) -> Aerate:
         """The `Aerate` instance in the documenter's Sphinx application."""
-        if self.env.app.aerate is None:
-            self.env.app.aerate = Aerate(self.env.app)
-        return self.env.app.aerate
+        return get_aerate(self.env.app)
+
+    @property
+    def manifest(self) -> Manifest:
+        """The manifest of the document that's being generated."""
+        return get_manifests(self.env).setdefault(self.env.docname, Manifest())
 
     def import_object(self) -> bool:
         """Set *self.object* to be the aeration to be documented."""
 
-        self.object = self.aerate.find_member(
-            self.modname, kind=self.aerationtype)
+        try:
+            self.object = self.aerate.find_member(
+                self.modname, kind=self.aerationtype)
+        except LookupError as error:
+            self.manifest.record_lookup(self.modname, self.aerationtype, None)
+            logger.warning(f"auto{self.objtype} can't import "
+                           f"{self.modname!r}: {error}")
+            return False
+        self.manifest.record_lookup(
+            self.modname, self.aerationtype, self.object)
         if self.object.kind != self.aerationtype:
             logger.warning(f"auto{self.objtype} name must reference a "
                            f"{self.aerationtype}")
             return False
-        self.aerate.adjuster.handle(self.object.matter)
+
+        # Hold the matter while the object is documented. The aeration itself
+        # doesn't, so this keeps the matter alive even if its document is
+        # evicted from the document cache in the meantime. The matter is only
+        # adjusted if its description isn't in the render cache, but adjusting
+        # doesn't change the text of the nodes used in the directive line.
+        self.matter = self.object.matter
+        self.manifest.record_definition(self.object)
         return True
 
+    def format_name(self) -> str:
+        return format_signature(self.object, self.matter)
+
     def get_doc(self, *args, **kwargs) -> List[List[str]]:
-        buffer = ""
+        with self.aerate.trace("get_doc", id=self.object.id):
+            return [self.describe(self.object)]
+
+    def describe(self, aeration) -> List[str]:
+        """
+        Return the lines of the description of the *aeration*.
+
+        If ``aerate_render_nodes`` is configured then the description is
+        rendered as docutils nodes instead, and this is a single
+        ``aerate-description`` directive that inserts them.
+        """
+
+        if not self.config.aerate_render_nodes:
+            return aeration.describe().splitlines()
+
+        output = aeration.describe(as_nodes=True)
+        if not output:
+            return []
+        add_function_parentheses(output, self.config)
+        token = str(next(DescriptionDirective.tokens))
+        get_pending_descriptions(self.env.app)[token] = output
+        return [f".. aerate-description:: {token}"]
+
+    def generate(self, *args, **kwargs):
+        tracer = self.aerate.tracer
+        if tracer is not None:
+            tracer.context["docname"] = self.env.docname
+
+        # Record each aeration retrieved while the document is generated (on a
+        # render cache hit this is still done to validate the stored output)
+        # other than the compound of the documented aeration
+        with self.aerate.detect_used() as sentry, self.aerate.trace(
+                "generate", name=self.name, objtype=self.objtype):
+            self.generate_document(*args, **kwargs)
+
+        if tracer is not None:
+            del tracer.context["docname"]
+            tracer.flush()
 
-        for prefix in ("brief", "detailed", "inbody"):
-            (node,) = self.object.matter.xpath(f"./{prefix}description")
-            output = self.aerate.render(node, before=buffer)
-            if not output:
-                continue
-            buffer += ("\n\n" if buffer else "") + output
+        references = sentry.references
+        if self.object is not None:
+            references.discard(self.object.symbol.parent)
 
-        return [buffer.splitlines()]
+        graph = get_reference_graph(self.env)
+        for id in references:
+            graph.record(self.env.docname, id, self.aerate.resolve(id))
+        for key in sentry.renders:
+            self.manifest.record_render(key)
+
+    def generate_document(self, *args, **kwargs):
+        """Generate the reST of the object (in :meth:`generate`)."""
+        super().generate(*args, **kwargs)
 
     def resolve_name(self, modname: str, parents: Any, path: str, base: Any
                      ) -> Tuple[str, List[str]]:
         """Return the name of the object to document as the module name."""
         return base, []
 
-    def generate(self, *args, **kwargs):
-        # Record each document used in the directive's filename set
-        with self.aerate.detect_used() as sentry:
-            super().generate(*args, **kwargs)
-        used = {"index.xml"} | sentry.record
-        used = {os.path.join(self.aerate.doxygen_root, i) for i in used}
-        self.directive.record_dependencies |= used
-
 
 class FunctionDocumenter(AerationDocumenter):
     aerationtype = "function"
     objtype = "aeratefunction"
     directivetype = "function"
 
-    def format_name(self) -> str:
-        anchor = self.object.anchor
-        type_text = self.object.matter.xpath("string(./type)")
-        (definition_node,) = self.object.matter.xpath("./definition")
-        (argsstring_node,) = self.object.matter.xpath("./argsstring")
-        return f"{type_text} {anchor}{argsstring_node.text}"
-        # return definition_node.text + argsstring_node.text
-
 
 class MacroDocumenter(AerationDocumenter):
     aerationtype = "define"
     objtype = "aeratemacro"
     directivetype = "macro"
 
-    def format_name(self) -> str:
-        anchor = self.object.anchor
-        namelist = self.object.matter.xpath("./param/defname[1]/text()")
-        if not namelist:
-            return anchor
-        return f"{anchor}({', '.join(namelist)})"
-
 
 class TypeDocumenter(AerationDocumenter):
     aerationtype = "typedef"
     objtype = "aeratetype"
     directivetype = "type"
 
-    def format_name(self) -> str:
-        (type_node,) = self.object.matter.xpath("./type")
-        (name_node,) = self.object.matter.xpath("./name")
-        return type_node.text + name_node.text
-
 
 class StructDocumenter(AerationDocumenter):
     aerationtype = "struct"
     objtype = "aeratestruct"
     directivetype = "struct"
 
-    def format_name(self) -> str:
-        (type_node,) = self.object.matter.xpath("./type")
-        (name_node,) = self.object.matter.xpath("./name")
-        return type_node.text + name_node.text
+
+def kinds_option(argument: str) -> set:
+    """Return the set of member kinds in a ``:kinds:`` option."""
+
+    kinds = set(argument.replace(",", " ").split())
+    unknown = kinds - set(DIRECTIVES)
+    if unknown:
+        raise ValueError(f"unknown kind: {', '.join(sorted(unknown))}")
+    return kinds
+
+
+class CompoundDocumenter(AerationDocumenter):
+    """
+    Specialized, abstract Documenter subclass for each member of a compound.
+
+    Rather than look up and load each member on its own, each ``<memberdef>``
+    is taken from the ``<sectiondef>``\\s of the compound's matter in a single
+    pass, in the order that Doxygen lists them. The compound's description is
+    generated first, which adjusts the compound's matter (and each member in
+    it) at once. Only a member with a kind in the ``:kinds:`` option (or with
+    a directive in :data:`~aerate.signature.DIRECTIVES`) is documented.
+    """
+
+    option_spec = dict(Documenter.option_spec, kinds=kinds_option)
+
+    @classmethod
+    def can_document_member(cls, member: Any, *args, **kwargs) -> bool:
+        return False
+
+    def parse_name(self) -> bool:
+        # The name of a compound (such as "foo.c") isn't a Python name
+        self.modname = self.fullname = self.name
+        self.objpath, self.args, self.retann = [], None, None
+        return True
+
+    def import_object(self) -> bool:
+        """Set *self.object* to be the compound to be documented."""
+
+        try:
+            self.object = self.aerate.find_compound(
+                self.modname, kind=self.aerationtype)
+        except LookupError as error:
+            self.manifest.record_compound_lookup(
+                self.modname, self.aerationtype, None)
+            logger.warning(f"auto{self.objtype} can't import "
+                           f"{self.modname!r}: {error}")
+            return False
+        self.manifest.record_compound_lookup(
+            self.modname, self.aerationtype, self.object)
+
+        self.matter = self.object.matter
+        self.manifest.record_definition(self.object)
+        return True
+
+    def iter_members(self):
+        """Return an iterator through each member aeration to document."""
+
+        kinds = self.options.get("kinds") or DIRECTIVES
+        for sectiondef in self.matter.iterchildren("sectiondef"):
+            for memberdef in sectiondef.iterchildren("memberdef"):
+                if memberdef.get("kind") not in kinds:
+                    continue
+                try:
+                    yield self.aerate[memberdef.get("id")]
+                except LookupError as error:
+                    logger.warning(f"auto{self.objtype} {self.modname!r}: "
+                                   f"{error}")
+
+    def generate_document(self, *args, **kwargs):
+        if not self.parse_name() or not self.import_object():
+            return
+
+        self.analyzer = None
+        sourcename = self.get_sourcename()
+
+        for line in self.describe(self.object):
+            self.add_line(line, sourcename)
+
+        for member in self.iter_members():
+            self.manifest.record_definition(member)
+            signature = format_signature(member, member.matter)
+            self.add_line("", sourcename)
+            self.add_line(f".. c:{DIRECTIVES[member.kind]}:: {signature}",
+                          sourcename)
+
+            description = self.describe(member)
+            if description:
+                self.add_line("", sourcename)
+            for line in description:
+                self.add_line(f"   {line}" if line else "", sourcename)
+
+
+class FileDocumenter(CompoundDocumenter):
+    aerationtype = "file"
+    objtype = "aeratefile"
+
+
+class GroupDocumenter(CompoundDocumenter):
+    aerationtype = "group"
+    objtype = "aerategroup"
+
+
+class DescriptionDirective(SphinxDirective):
+    """
+    Insert the docutils nodes of a description rendered by a documenter.
+
+    The argument is the token that the documenter stored the nodes with (see
+    :meth:`AerationDocumenter.describe`). As the content that a documenter
+    generates is parsed right after it's generated, the nodes are taken from
+    the same process that rendered them.
+    """
+
+    required_arguments = 1
+
+    # The source of each token
+    tokens = itertools.count()
+
+    def run(self):
+        output = get_pending_descriptions(self.env.app).pop(
+            self.arguments[0], None)
+        if output is None:
+            logger.warning(f"aerate-description {self.arguments[0]!r} isn't "
+                           f"a rendered description",
+                           location=self.get_location())
+            return []
+        return output
+
+
+def get_aerate(sphinx) -> Aerate:
+    """Return the `Aerate` instance in the Sphinx application."""
+    if sphinx.aerate is None:
+        sphinx.aerate = Aerate.from_sphinx(sphinx)
+        profiler = get_profiler(sphinx.env)
+        if profiler is not None:
+            profiler.attach(sphinx.aerate)
+        if sphinx.config.aerate_trace:
+            sphinx.aerate.tracer = Tracer(get_trace_root(sphinx), "sphinx")
+    return sphinx.aerate
+
+
+def get_pending_descriptions(sphinx):
+    """
+    Return the map from each token to the nodes of a rendered description
+    that hasn't been inserted by a `DescriptionDirective` yet.
+    """
+    if not hasattr(sphinx, "aerate_pending_descriptions"):
+        sphinx.aerate_pending_descriptions = {}
+    return sphinx.aerate_pending_descriptions
+
+
+def get_manifests(env):
+    """Return the map from each document to its `Manifest` in the *env*."""
+    if not hasattr(env, "aerate_manifests"):
+        env.aerate_manifests = {}
+    return env.aerate_manifests
+
+
+def get_reference_graph(env) -> ReferenceGraph:
+    """Return the `ReferenceGraph` of the documents in the *env*."""
+    if not hasattr(env, "aerate_reference_graph"):
+        env.aerate_reference_graph = ReferenceGraph()
+    return env.aerate_reference_graph
+
+
+def get_profiler(env):
+    """Return the `Profiler` in the *env* or ``None`` if it isn't enabled."""
+    return getattr(env, "aerate_profiler", None)
+
+
+def get_trace_root(sphinx):
+    """Return the directory that each process writes its trace to."""
+    return os.path.join(sphinx.doctreedir, "aerate", "trace")
+
+
+def on_builder_inited(sphinx):
+    """
+    Make the `Aerate` instance before any document is read.
+
+    This way in a parallel build each process shares the symbol index (which
+    is mapped into memory) of the instance in the main process rather than
+    load its own. Then the render cache is filled if ``aerate_prewarm`` is
+    configured and the environment has no manifests (as in the first build or
+    a build with ``-E``). In an incremental build only the documents that are
+    outdated are read again, so describing every aeration would only slow it
+    down.
+
+    If ``aerate_profile`` is configured then the `Profiler` is made here and
+    stored in the environment, so that what each process records in a
+    parallel build is merged back into the main process along with it.
+    """
+
+    # This replaces any profiler from the previous build
+    enabled = bool(sphinx.config.aerate_profile)
+    sphinx.env.aerate_profiler = Profiler() if enabled else None
+
+    # Likewise this removes the trace of each process from the previous build
+    for path in glob.glob(os.path.join(get_trace_root(sphinx), "*.jsonl")):
+        os.remove(path)
+
+    root = sphinx.config.aerate_doxygen_root
+    if not os.path.exists(os.path.join(root, "index.xml")):
+        return
+    aerate = get_aerate(sphinx)
+
+    value = sphinx.config.aerate_prewarm
+    if not value or get_manifests(sphinx.env):
+        return
+
+    if not aerate.render_cache.enabled:
+        logger.warning("aerate_prewarm requires aerate_render_cache_size")
+        return
+
+    workers = None if value is True else int(value)
+    with aerate.trace("prewarm", workers=workers):
+        count, failed = prewarm(
+            aerate, workers, nodes=sphinx.config.aerate_render_nodes)
+    logger.info(f"aerate: prewarmed {count} descriptions ({failed} failed)")
+
+
+def on_env_get_outdated(sphinx, env, added, changed, removed):
+    """
+    Return each document with a `Manifest` that's outdated or that refers to
+    an aeration that's changed in the `ReferenceGraph`.
+
+    Doxygen rewrites each XML file whenever it runs, so rather than record the
+    XML files as dependencies of a document (which would outdate it in every
+    build) aerate decides if a document is outdated from its manifest. If
+    there's no ``index.xml`` (as Doxygen hasn't run, or its output has been
+    removed) then no document is outdated, and each manifest is kept until
+    it can be checked in a later build.
+    """
+
+    manifests = get_manifests(env)
+    graph = get_reference_graph(env)
+    if not manifests and not graph.references:
+        return []
+
+    root = sphinx.config.aerate_doxygen_root
+    if not os.path.exists(os.path.join(root, "index.xml")):
+        logger.warning(f"aerate can't check if any document is outdated as "
+                       f"{root!r} has no index.xml")
+        return []
+
+    aerate = get_aerate(sphinx)
+    outdated = graph.find_outdated(aerate)
+    outdated.update(docname for docname, manifest in manifests.items()
+                    if docname not in outdated
+                    and manifest.is_outdated(aerate))
+    return list(outdated - added - changed - removed)
+
+
+def on_env_purge_doc(sphinx, env, docname):
+    get_manifests(env).pop(docname, None)
+    get_reference_graph(env).purge(docname)
+
+
+def on_env_updated(sphinx, env):
+    """
+    Retain each render cache entry used by a document in the render cache.
+
+    In a parallel build this runs in the main process once what each process
+    used has been merged into the *env*. As the other processes don't evict
+    entries from the render cache, this is where it's brought back under its
+    limits in a parallel build.
+    """
+
+    if sphinx.aerate is None:
+        return
+    keys = set()
+    for manifest in get_manifests(env).values():
+        keys |= manifest.renders
+    sphinx.aerate.render_cache.retain(keys)
+
+
+def on_env_merge_info(sphinx, env, docnames, other):
+    manifests = get_manifests(other)
+    get_manifests(env).update(
+        (docname, manifests[docname])
+        for docname in docnames if docname in manifests)
+    get_reference_graph(env).merge(get_reference_graph(other), docnames)
+
+    profiler = get_profiler(env)
+    if profiler is not None and get_profiler(other) is not None:
+        profiler.merge(get_profiler(other))
+
+
+def on_build_finished(sphinx, exception):
+    """
+    Print a summary of the `Aerate` instance's stats if ``aerate_stats`` is
+    configured, print a summary of the `Profiler` and write it as JSON to the
+    file in ``aerate_profile``, and merge the trace of each process into the
+    file in ``aerate_trace``.
+    """
+
+    if sphinx.aerate is not None and sphinx.config.aerate_stats:
+        for line in format_stats(sphinx.aerate.stats()):
+            logger.info(f"aerate: {line}")
+
+    tracer = None if sphinx.aerate is None else sphinx.aerate.tracer
+    if tracer is not None:
+        tracer.flush()
+        path = config_path(sphinx, sphinx.config.aerate_trace, "trace.json")
+        count = merge(tracer.root, path)
+        logger.info(f"aerate: wrote {count} trace events to {path}")
+
+    profiler = get_profiler(sphinx.env)
+    if profiler is None:
+        return
+
+    for line in profiler.report():
+        logger.info(f"aerate: {line}")
+
+    path = config_path(sphinx, sphinx.config.aerate_profile, "profile.json")
+    with open(path, "w") as file:
+        json.dump(profiler.as_dict(), file, indent=2)
+    logger.info(f"aerate: wrote the rule profile to {path}")
+
+    # The profile of each build starts over in the next one
+    sphinx.env.aerate_profiler = None
+
+
+def format_stats(stats):
+    """Return a list of lines that summarize the *stats* of an instance."""
+
+    documents = stats["document_cache"]
+    renders = stats["render_cache"]
+    lines = [
+        f"document cache: {documents['entries']} entries "
+        f"({documents['bytes'] / 2 ** 20:.1f} MiB, "
+        f"{documents['elements']} elements), {documents['hits']} hits, "
+        f"{documents['misses']} misses, {documents['evictions']} evictions",
+        f"parsed {documents['parsed']} documents "
+        f"({documents['parsed_bytes'] / 2 ** 20:.1f} MiB) "
+        f"in {documents['parse_time']:.3f} s",
+        f"render cache: {renders['hits']} hits, {renders['misses']} misses, "
+        f"{renders['evictions']} evictions",
+        f"memos: {stats['aeration_memo']['entries']} aerations "
+        f"({stats['aeration_memo']['anchors']} anchors), "
+        f"{stats['file_digest_memo']['entries']} file digests",
+    ]
+    for item in stats["largest_documents"]:
+        lines.append(f"  {item['name']:40} {item['bytes'] / 2 ** 10:9.1f} KiB "
+                     f"{item['elements']:8} elements")
+    return lines
+
+
+def config_path(sphinx, value, default):
+    """
+    Return the path of an output file configured as *value*.
+
+    This is relative to the directory containing ``conf.py``, or is *default*
+    in the "aerate" directory in the doctree directory if *value* is True.
+    """
+
+    if value is True:
+        path = os.path.join(sphinx.doctreedir, "aerate", default)
+    else:
+        path = os.path.join(sphinx.confdir, value)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
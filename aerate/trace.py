@@ -0,0 +1,129 @@
+import glob
+import json
+import os
+import threading
+import time
+import weakref
+
+__all__ = ("Span", "Tracer", "merge")
+
+# Each tracer that's cleared in a forked process
+TRACERS = weakref.WeakSet()
+
+
+def clear_tracers():
+    """Clear each tracer (in a process that was just forked)."""
+    for tracer in list(TRACERS):
+        tracer.clear()
+
+
+os.register_at_fork(after_in_child=clear_tracers)
+
+
+class Tracer:
+    """
+    Records spans of time in the Chrome trace event format.
+
+    Each span is recorded as a complete ("X") event with the id of the
+    process and thread that it was recorded in. The events are written by
+    :meth:`flush` to a file in the *root* directory named by the process id,
+    so that any number of processes (such as in a parallel Sphinx build or in
+    a prewarm) can record spans into the same *root*. These are combined into
+    a single trace by :func:`merge`, which can be opened in Perfetto or in
+    ``chrome://tracing``.
+
+    Each item in the tracer's *context* is added to the arguments of each
+    span. A tracer is cleared in a process forked from the one that made it,
+    so that the spans of the original process are only written by it. The
+    process is labeled *name* in the trace, or as a worker of *name* if it was
+    forked.
+    """
+
+    def __init__(self, root, name="main"):
+        self.root = root
+        self.name = name
+        self.pid = os.getpid()
+        self.events = []
+        self.context = {}
+        self.named = False
+
+        os.makedirs(root, exist_ok=True)
+        TRACERS.add(self)
+
+    def span(self, event, **args):
+        """
+        Return a context manager that records a span named *event*.
+
+        The *args* are recorded along with the span. The context manager
+        returns them as a dictionary so that more can be added inside it.
+        """
+        return Span(self, event, args)
+
+    def record(self, name, start, end, args):
+        """Record a span named *name* from *start* to *end* in seconds."""
+        self.events.append({
+            "name": name, "cat": "aerate", "ph": "X",
+            "ts": start * 1e6, "dur": (end - start) * 1e6,
+            "pid": os.getpid(), "tid": threading.get_ident(),
+            "args": dict(self.context, **args),
+        })
+
+    def clear(self):
+        """Discard each span that hasn't been written."""
+        self.events.clear()
+        self.named = False
+
+    def flush(self):
+        """Write each span that hasn't been written to the process's file."""
+
+        pid = os.getpid()
+        if not self.named:
+            name = self.name if pid == self.pid else f"{self.name} worker"
+            self.events.insert(0, {
+                "name": "process_name", "ph": "M", "pid": pid,
+                "args": {"name": f"{name} {pid}"},
+            })
+            self.named = True
+
+        if not self.events:
+            return
+        with open(os.path.join(self.root, f"{pid}.jsonl"), "a") as file:
+            for event in self.events:
+                file.write(json.dumps(event) + "\n")
+        self.events.clear()
+
+
+class Span:
+    """A span recorded by a :class:`Tracer` (see :meth:`Tracer.span`)."""
+
+    __slots__ = ("tracer", "name", "args", "start")
+
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self.args
+
+    def __exit__(self, *args, **kwargs):
+        end = time.perf_counter()
+        self.tracer.record(self.name, self.start, end, self.args)
+
+
+def merge(root, path):
+    """
+    Combine the file of each process in the *root* directory into a trace.
+
+    The trace is written as JSON to *path*. Return the number of events in it.
+    """
+
+    events = []
+    for name in sorted(glob.glob(os.path.join(root, "*.jsonl"))):
+        with open(name) as file:
+            events.extend(json.loads(line) for line in file if line.strip())
+
+    with open(path, "w") as file:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+    return len(events)
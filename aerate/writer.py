@@ -0,0 +1,118 @@
+from contextlib import contextmanager
+
+__all__ = ("Writer",)
+
+# The characters that end a line in str.splitlines()
+LINE_BREAKS = "\n\r\v\f\x1c\x1d\x1e\x85\u2028\u2029"
+
+
+class Writer:
+    """
+    A buffer of reST that's indented as it's written.
+
+    Text written inside :meth:`indent` has each line that has anything other
+    than whitespace in it indented (as :func:`textwrap.indent` would do once
+    it's written), and text written inside :meth:`stripped` is stripped of
+    whitespace at its start and end (as :meth:`str.strip` would do), so that a
+    nested node is rendered in place rather than rendered, indented, and
+    concatenated at each level. The output is kept in a list of strings until
+    :meth:`getvalue`, and the *last* character written (before it's indented
+    or stripped) is kept to decide how inline markup is escaped.
+    """
+
+    def __init__(self, last=""):
+        self.parts = []
+        self.last = last
+
+        # The indentation of each line that's started
+        self.prefix = ""
+
+        # Whether a line has been started but nothing other than whitespace
+        # has been written in it, and that whitespace
+        self.at_line_start = True
+        self.pending = ""
+
+        # Whether whitespace is skipped until anything else is written
+        self.skipping = False
+
+    def getvalue(self) -> str:
+        """Return the text written to the writer."""
+        return "".join(self.parts) + self.pending
+
+    def write(self, text):
+        """Write the *text* to the writer."""
+
+        if not text:
+            return
+        self.last = text[-1]
+
+        # Text in the middle of a line is written as it is (a line break
+        # isn't printable)
+        if not self.at_line_start and not self.skipping \
+                and text.isprintable():
+            self.parts.append(text)
+            return
+
+        for line in text.splitlines(keepends=True):
+            if self.skipping:
+                line = line.lstrip()
+                if not line:
+                    continue
+                # The whitespace stripped at the start includes the prefix
+                if self.at_line_start:
+                    line = self.pending + line
+                    self.pending = ""
+                self.skipping = False
+            elif self.at_line_start:
+                if line.isspace():
+                    # Only a line with something other than whitespace in it
+                    # is indented
+                    if line[-1] in LINE_BREAKS:
+                        self.parts.append(self.pending + line)
+                        self.pending = ""
+                    else:
+                        self.pending += line
+                    continue
+                line = self.prefix + self.pending + line
+                self.pending = ""
+            self.parts.append(line)
+            self.at_line_start = line[-1] in LINE_BREAKS
+
+    @contextmanager
+    def indent(self, prefix):
+        """Indent each line started inside the context with *prefix*."""
+
+        previous = self.prefix
+        self.prefix += prefix
+        try:
+            yield self
+        finally:
+            self.prefix = previous
+
+    @contextmanager
+    def stripped(self, leading=True):
+        """
+        Strip the whitespace at the end of the text written inside the
+        context, and at its start if *leading* is true.
+        """
+
+        mark = len(self.parts)
+        state = (self.at_line_start, self.pending, self.skipping)
+        if leading:
+            self.skipping = True
+        try:
+            yield self
+        finally:
+            parts = self.parts
+            while len(parts) > mark:
+                part = parts[-1].rstrip()
+                if part:
+                    parts[-1] = part
+                    break
+                parts.pop()
+
+            if len(parts) > mark:
+                self.at_line_start, self.pending = False, ""
+                self.skipping = False
+            else:
+                self.at_line_start, self.pending, self.skipping = state
@@ -0,0 +1 @@
+"""Benchmarks of aerate on synthetic Doxygen XML. See python -m benchmark."""
@@ -0,0 +1,159 @@
+from benchmark import e2e, micro
+import argparse
+import itertools
+import json
+import platform
+import sys
+
+from lxml import etree
+
+
+def environment():
+    """Return a description of the environment that the benchmark ran in."""
+    return {
+        "python": platform.python_version(),
+        "lxml": ".".join(map(str, etree.LXML_VERSION)),
+        "platform": platform.platform(),
+    }
+
+
+def add_parameters(parser):
+    """Add an argument for each parameter of the generated Doxygen XML."""
+
+    group = parser.add_argument_group(
+        "generated Doxygen XML",
+        "Each parameter takes one or more values. The benchmark is run with "
+        "each combination of them.")
+    group.add_argument("--compounds", type=int, nargs="+", default=[10])
+    group.add_argument("--members", type=int, nargs="+", default=[20],
+                       help="the number of members in each compound")
+    group.add_argument("--paragraphs", type=int, nargs="+", default=[3],
+                       help="the number of paragraphs in each description")
+    group.add_argument("--depth", type=int, nargs="+", default=[1],
+                       help="the depth of lists nested in each description")
+    group.add_argument("--markup", type=float, nargs="+", default=[0.1],
+                       help="the probability of inline markup on each word")
+    group.add_argument("--refs", type=int, nargs="+", default=[1],
+                       help="the number of references in each paragraph")
+    group.add_argument("--seed", type=int, default=0)
+
+
+def iterparameters(args):
+    """Return an iterator through each combination of parameter values."""
+
+    names = ("compounds", "members", "paragraphs", "depth", "markup", "refs")
+    for values in itertools.product(*(getattr(args, name) for name in names)):
+        yield dict(zip(names, values), seed=args.seed)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmark",
+        description="Benchmark aerate on synthetic Doxygen XML.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser(
+        "micro", help="time each stage of aerate on its own")
+    add_parameters(command)
+    command.add_argument("--repeat", type=int, default=5)
+    command.add_argument("--only", nargs="+", choices=micro.BENCHMARKS,
+                         help="the benchmarks to run (default: each one)")
+    command.add_argument("-o", "--output", metavar="FILE",
+                         help="write the results as JSON to FILE")
+
+    command = commands.add_parser(
+        "e2e", help="time sphinx-build on a generated project")
+    command.add_argument("--members", type=int, nargs="+",
+                         default=[100, 1000, 10000],
+                         help="the number of members documented")
+    command.add_argument("--layout", nargs="+", choices=e2e.LAYOUTS,
+                         default=list(e2e.LAYOUTS),
+                         help="document each member on one page or on a page "
+                              "for each compound")
+    command.add_argument("--per-compound", type=int, default=20,
+                         help="the number of members in each compound")
+    command.add_argument("-j", "--jobs", type=int,
+                         help="the number of processes used by sphinx-build")
+    command.add_argument("--prewarm", type=int, default=0,
+                         help="the value of aerate_prewarm")
+    command.add_argument("--seed", type=int, default=0)
+    command.add_argument("-o", "--output", metavar="FILE",
+                         help="write the results as JSON to FILE")
+    command.add_argument("--baseline", metavar="FILE",
+                         help="compare the results to those in FILE (from "
+                              "--output) and exit with status 1 if any "
+                              "regressed")
+    command.add_argument("--time-threshold", type=float, default=0.2,
+                         help="the fraction that a time can be slower than "
+                              "its baseline (default: %(default)s)")
+    command.add_argument("--memory-threshold", type=float, default=0.1,
+                         help="the fraction that the peak RSS can be larger "
+                              "than its baseline (default: %(default)s)")
+
+    args = parser.parse_args(argv)
+    if args.command == "e2e":
+        return main_e2e(args)
+
+    runs = []
+    for parameters in iterparameters(args):
+        results = micro.run(parameters, args.repeat, args.only)
+        runs.append({"parameters": parameters, "results": results})
+
+        print(", ".join(f"{name}={value}"
+                        for name, value in parameters.items()))
+        for name, result in results.items():
+            print(f"  {name:24} {result['best'] * 1000:10.3f} ms "
+                  f"({result['items']} items)")
+
+    output = {"benchmark": args.command, "environment": environment(),
+              "runs": runs}
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(output, file, indent=2)
+    return 0
+
+
+def main_e2e(args):
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as file:
+            for run in json.load(file)["runs"]:
+                baseline[json.dumps(run["parameters"], sort_keys=True)] = (
+                    run["results"])
+
+    runs, regressions = [], 0
+    for members, layout in itertools.product(args.members, args.layout):
+        parameters = {"members": members, "layout": layout,
+                      "per_compound": args.per_compound, "jobs": args.jobs,
+                      "prewarm": args.prewarm, "seed": args.seed}
+        results = e2e.run(**parameters)
+        runs.append({"parameters": parameters, "results": results})
+
+        print(f"members={results['members']}, layout={layout}")
+        for name in ("full", "touch", "modify"):
+            build = results[name]
+            print(f"  {name:8} read {build['read']:8.3f} s  "
+                  f"write {build['write']:8.3f} s  "
+                  f"total {build['total']:8.3f} s  "
+                  f"peak {build['peak_rss'] / 2 ** 20:8.1f} MiB  "
+                  f"({build['read_docs']} read)")
+
+        previous = baseline.get(json.dumps(parameters, sort_keys=True))
+        if previous is None:
+            continue
+        for metric, before, value in e2e.compare(
+                results, previous, args.time_threshold,
+                args.memory_threshold):
+            regressions += 1
+            print(f"  regressed: {metric} {before:.3f} -> {value:.3f}")
+
+    output = {"benchmark": args.command, "environment": environment(),
+              "runs": runs}
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(output, file, indent=2)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
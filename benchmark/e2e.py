@@ -0,0 +1,185 @@
+from benchmark.generate import generate
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+__all__ = ("LAYOUTS", "compare", "flatten", "project", "run")
+
+# The root of the repository, so that aerate and benchmark.phases can be
+# imported in sphinx-build
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The directive used to document each kind of member that's generated
+DIRECTIVES = {
+    "function": "autoaeratefunction", "define": "autoaeratemacro",
+    "typedef": "autoaeratetype",
+}
+
+# The layout of the pages in a generated project
+LAYOUTS = ("one", "many")
+
+CONF = """\
+extensions = ["aerate", "benchmark.phases"]
+benchmark_phases_output = {output!r}
+aerate_prewarm = {prewarm!r}
+"""
+
+
+def page(title, members):
+    """Return the reST of a page titled *title* that documents *members*."""
+
+    lines = [title, "=" * len(title), ""]
+    for _, kind, name in members:
+        lines += [f".. {DIRECTIVES[kind]}:: {name}", ""]
+    return "\n".join(lines)
+
+
+def compound_of(id):
+    """Return the id of the compound of the member with the *id*."""
+    return id.rsplit("_1", 1)[0]
+
+
+def write(path, text):
+    with open(path, "w") as file:
+        file.write(text)
+
+
+def project(root, members=100, layout="many", per_compound=20, prewarm=False,
+            seed=0):
+    """
+    Generate a Sphinx project in the *root* directory that documents about
+    *members* members of a synthetic Doxygen XML output in ``root/xml``.
+
+    There are *per_compound* members in each compound. If the *layout* is
+    "one" then each member is documented on the index page, and if it's
+    "many" then there's a page for each compound. Return a list of the ``(id,
+    kind, name)`` of each member.
+    """
+
+    compounds = max(1, -(-members // per_compound))
+    result = generate(os.path.join(root, "xml"), compounds=compounds,
+                      members=min(members, per_compound), seed=seed)
+
+    write(os.path.join(root, "conf.py"), CONF.format(
+        output=os.path.join(root, "phases.json"), prewarm=prewarm))
+
+    if layout == "one":
+        write(os.path.join(root, "index.rst"), page("Index", result))
+        return result
+
+    pages = {}
+    for member in result:
+        pages.setdefault(compound_of(member[0]), []).append(member)
+    for compound, items in pages.items():
+        write(os.path.join(root, f"{compound}.rst"), page(compound, items))
+    toctree = "".join(f"   {compound}\n" for compound in pages)
+    write(os.path.join(root, "index.rst"),
+          f"Index\n=====\n\n.. toctree::\n\n{toctree}")
+    return result
+
+
+def build(root, jobs=None):
+    """
+    Run sphinx-build on the project in *root* and return its timings.
+
+    This runs in a separate process so that its peak RSS is its own.
+    """
+
+    command = [sys.executable, "-m", "sphinx", "-b", "html", "-q", root,
+               os.path.join(root, "_build")]
+    if jobs is not None:
+        command[3:3] = ["-j", str(jobs)]
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(
+        filter(None, (ROOT, os.environ.get("PYTHONPATH")))))
+
+    output = os.path.join(root, "phases.json")
+    if os.path.exists(output):
+        os.remove(output)
+
+    start = time.perf_counter()
+    process = subprocess.run(command, env=env, stdout=subprocess.DEVNULL,
+                             stderr=subprocess.PIPE, text=True)
+    total = time.perf_counter() - start
+    if process.returncode != 0:
+        raise RuntimeError(f"sphinx-build failed:\n{process.stderr}")
+
+    with open(output) as file:
+        result = json.load(file)
+    result["total"] = total
+    result["warnings"] = process.stderr.count("WARNING")
+    return result
+
+
+def modify(path):
+    """Change the first brief description in the XML file at *path*."""
+
+    with open(path) as file:
+        text = file.read()
+    write(path, text.replace("<briefdescription>\n<para>",
+                             "<briefdescription>\n<para>changed ", 1))
+
+
+def run(members=100, layout="many", per_compound=20, jobs=None,
+        prewarm=False, seed=0):
+    """
+    Benchmark sphinx-build on a generated project and return its timings.
+
+    The project is built from scratch ("full"), then again after one XML file
+    of the Doxygen output is touched ("touch", as Doxygen rewrites each file
+    whenever it runs), then again after that file's content is changed
+    ("modify"). Each is a map of the read and write phase times, the total
+    time (including the startup of sphinx-build), the peak RSS in bytes, the
+    number of documents read, and the number of warnings.
+    """
+
+    with tempfile.TemporaryDirectory(prefix="aerate-benchmark-") as root:
+        result = project(root, members, layout, per_compound, prewarm, seed)
+        path = os.path.join(root, "xml", f"{compound_of(result[0][0])}.xml")
+
+        full = build(root, jobs)
+        os.utime(path)
+        touch = build(root, jobs)
+        modify(path)
+        changed = build(root, jobs)
+
+    return {"members": len(result), "full": full, "touch": touch,
+            "modify": changed}
+
+
+def flatten(results):
+    """Return a map from "<build>.<metric>" to each metric in *results*."""
+    return {f"{name}.{metric}": value
+            for name, build in results.items() if isinstance(build, dict)
+            for metric, value in build.items()}
+
+
+def compare(results, baseline, time_threshold=0.2, memory_threshold=0.1,
+            minimum=0.05):
+    """
+    Return a list of each regression of *results* from the *baseline*.
+
+    A time regresses if it's more than *time_threshold* (a fraction) slower
+    than in the *baseline*, unless it's slower by less than *minimum* seconds.
+    The peak RSS regresses if it's more than *memory_threshold* larger. Each
+    regression is a tuple of the metric, its baseline value, and its value.
+    """
+
+    new, old = flatten(results), flatten(baseline)
+    result = []
+    for metric, value in new.items():
+        if metric not in old:
+            continue
+        before = old[metric]
+        if metric.endswith(".peak_rss"):
+            regressed = value > before * (1 + memory_threshold)
+        elif metric.split(".")[-1] in ("read", "write", "total"):
+            regressed = (value > before * (1 + time_threshold)
+                         and value - before >= minimum)
+        else:
+            continue
+        if regressed:
+            result.append((metric, before, value))
+    return result
@@ -0,0 +1,174 @@
+from xml.sax.saxutils import quoteattr
+import os
+import random
+
+__all__ = ("generate",)
+
+WORDS = (
+    "the vector element index value buffer length capacity return insert "
+    "remove first last count size pointer memory allocate release copy move "
+    "compare search sort order range begin end next previous node tree"
+).split()
+
+# The kinds of member that are generated and how often each is generated
+KINDS = ("function",) * 6 + ("define",) * 2 + ("typedef",) * 2
+
+INLINE = ("bold", "emphasis", "computeroutput")
+
+
+class Generator:
+    """Generates the XML of a synthetic Doxygen output (see `generate`)."""
+
+    def __init__(self, compounds, members, paragraphs, depth, markup, refs,
+                 seed):
+        self.random = random.Random(seed)
+        self.paragraphs = paragraphs
+        self.depth = depth
+        self.markup = markup
+        self.refs = refs
+
+        # A list of (compound id, compound name, [(id, kind, name), ...])
+        self.compounds = []
+        for i in range(compounds):
+            id = f"file{i}_8h"
+            self.compounds.append((id, f"file{i}.h", [
+                (f"{id}_1a{i:08x}{j:024x}", self.random.choice(KINDS),
+                 f"file{i}_member{j}")
+                for j in range(members)
+            ]))
+        self.members = [member for _, _, members in self.compounds
+                        for member in members]
+
+    def words(self, count):
+        """Return *count* words, some of them with inline markup."""
+
+        result = []
+        for _ in range(count):
+            word = self.random.choice(WORDS)
+            if self.random.random() < self.markup:
+                tag = self.random.choice(INLINE)
+                word = f"<{tag}>{word}</{tag}>"
+            result.append(word)
+        return " ".join(result)
+
+    def ref(self):
+        id, _, name = self.random.choice(self.members)
+        return f'<ref refid="{id}" kindref="member">{name}</ref>'
+
+    def para(self, depth):
+        """Return a ``<para>`` with a list nested *depth* levels inside it."""
+
+        parts = [self.words(self.random.randint(4, 12))]
+        for _ in range(self.refs):
+            parts.append(self.ref())
+            parts.append(self.words(self.random.randint(1, 6)))
+        text = " ".join(parts) + "."
+
+        if depth > 0:
+            items = "".join(
+                f"<listitem>{self.para(depth - 1)}</listitem>\n"
+                for _ in range(2))
+            text += f"<itemizedlist>\n{items}</itemizedlist>\n"
+        return f"<para>{text} </para>\n"
+
+    def memberdef(self, id, kind, name):
+        brief = f"<para>{self.words(6)} {self.ref()}. </para>\n"
+        detailed = "".join(self.para(self.depth if i == 0 else 0)
+                           for i in range(self.paragraphs))
+
+        if kind == "function":
+            detailed += (
+                "<para><parameterlist kind=\"param\"><parameteritem>\n"
+                "<parameternamelist><parametername>value</parametername>"
+                "</parameternamelist>\n<parameterdescription>"
+                f"<para>{self.words(8)} </para>\n</parameterdescription>\n"
+                "</parameteritem>\n</parameterlist>\n"
+                "<simplesect kind=\"return\">"
+                f"<para>{self.words(5)} </para>\n</simplesect>\n</para>\n")
+            head = (f"<type>int</type>\n<definition>int {name}</definition>\n"
+                    f"<argsstring>(int value)</argsstring>\n"
+                    f"<name>{name}</name>\n"
+                    "<param><type>int</type><declname>value</declname>"
+                    "</param>\n")
+        elif kind == "define":
+            head = (f"<name>{name}</name>\n"
+                    "<param><defname>a</defname></param>\n"
+                    "<param><defname>b</defname></param>\n"
+                    "<initializer>((a) + (b))</initializer>\n")
+        else:
+            head = (f"<type>struct {name}_s</type>\n"
+                    f"<definition>typedef struct {name}_s {name}"
+                    f"</definition>\n<argsstring></argsstring>\n"
+                    f"<name>{name}</name>\n")
+
+        return (
+            f'<memberdef kind="{kind}" id="{id}" prot="public" static="no">\n'
+            f"{head}<briefdescription>\n{brief}</briefdescription>\n"
+            f"<detaileddescription>\n{detailed}</detaileddescription>\n"
+            "<inbodydescription>\n</inbodydescription>\n"
+            '<location file="file.h" line="1" column="1"/>\n'
+            "</memberdef>\n")
+
+    def compounddef(self, id, name, members):
+        sections = {}
+        for member in members:
+            sections.setdefault(member[1], []).append(self.memberdef(*member))
+
+        body = "".join(
+            f'<sectiondef kind="{SECTIONS[kind]}">\n{"".join(items)}'
+            "</sectiondef>\n" for kind, items in sections.items())
+        return (
+            "<?xml version='1.0' encoding='UTF-8' standalone='no'?>\n"
+            '<doxygen version="1.8.20">\n'
+            f'<compounddef id="{id}" kind="file" language="C++">\n'
+            f"<compoundname>{name}</compoundname>\n{body}"
+            "<briefdescription>\n</briefdescription>\n"
+            "<detaileddescription>\n</detaileddescription>\n"
+            f'<location file={quoteattr(name)}/>\n'
+            "</compounddef>\n</doxygen>\n")
+
+    def index(self):
+        compounds = []
+        for id, name, members in self.compounds:
+            items = "".join(
+                f'<member refid="{member_id}" kind="{kind}">'
+                f"<name>{member_name}</name></member>\n"
+                for member_id, kind, member_name in members)
+            compounds.append(f'<compound refid="{id}" kind="file">'
+                             f"<name>{name}</name>\n{items}</compound>\n")
+        return (
+            "<?xml version='1.0' encoding='UTF-8' standalone='no'?>\n"
+            '<doxygenindex version="1.8.20">\n'
+            f"{''.join(compounds)}</doxygenindex>\n")
+
+
+SECTIONS = {"function": "func", "define": "define", "typedef": "typedef"}
+
+
+def generate(root, compounds=10, members=20, paragraphs=3, depth=1,
+             markup=0.1, refs=1, seed=0):
+    """
+    Generate a synthetic Doxygen XML output in the *root* directory.
+
+    This consists of an ``index.xml`` and a file for each of *compounds*
+    compounds, each with *members* members of a random kind (a function,
+    define, or typedef). The detailed description of each member has
+    *paragraphs* paragraphs, the first of which has lists nested *depth*
+    levels deep. Each word has a *markup* probability to have inline markup
+    and each paragraph has *refs* references to a random member. The output is
+    the same for each *seed*.
+
+    Return a list of the ``(id, kind, name)`` of each member.
+    """
+
+    generator = Generator(compounds, members, paragraphs, depth, markup, refs,
+                          seed)
+
+    os.makedirs(root, exist_ok=True)
+    for id, name, items in generator.compounds:
+        with open(os.path.join(root, f"{id}.xml"), "w") as file:
+            file.write(generator.compounddef(id, name, items))
+    with open(os.path.join(root, "index.xml"), "w") as file:
+        file.write(generator.index())
+
+    return generator.members
@@ -0,0 +1,144 @@
+from aerate.aerate import Aerate
+from aerate.cache import DocumentCache
+from benchmark.generate import generate
+import statistics
+import tempfile
+import time
+
+__all__ = ("BENCHMARKS", "measure", "run")
+
+
+def prepare(root):
+    """Return an aerate instance on the *root* with nothing cached."""
+
+    aerate = Aerate(root)
+    aerate.document_cache = DocumentCache()
+    return aerate
+
+
+def matters(aerate, members, adjust=False):
+    """Return the matter of each member, adjusted if *adjust* is true."""
+
+    result = [aerate.find_member(name, kind).matter
+              for _, kind, name in members]
+    if adjust:
+        for matter in result:
+            aerate.adjuster.handle(matter)
+    return result
+
+
+def bench_load_document(root, members):
+    aerate = prepare(root)
+    filenames = sorted({f"{aerate.index[id].parent}.xml"
+                        for id, _, _ in members})
+
+    def run():
+        for filename in filenames:
+            aerate.load_document(filename)
+        return len(filenames)
+
+    return run
+
+
+def bench_canonical_node_by_id(root, members):
+    aerate = prepare(root)
+    ids = [id for id, _, _ in members]
+
+    def run():
+        for id in ids:
+            aerate.canonical_node_by_id(id)
+        return len(ids)
+
+    return run
+
+
+def bench_find_member(root, members):
+    aerate = prepare(root)
+
+    def run():
+        for _, kind, name in members:
+            aerate.find_member(name, kind)
+        return len(members)
+
+    return run
+
+
+def bench_adjust(root, members):
+    aerate = prepare(root)
+    nodes = matters(aerate, members)
+
+    def run():
+        for node in nodes:
+            aerate.adjuster.handle(node)
+        return len(nodes)
+
+    return run
+
+
+def bench_render(root, members):
+    aerate = prepare(root)
+    nodes = [node for matter in matters(aerate, members, adjust=True)
+             for node in matter.iterchildren(
+                 "briefdescription", "detaileddescription",
+                 "inbodydescription")]
+
+    def run():
+        for node in nodes:
+            aerate.renderer.invoke(node)
+        return len(members)
+
+    return run
+
+
+# Each benchmark is a function that prepares the benchmark on the Doxygen XML
+# in a root directory and returns a function that runs it once, returning the
+# number of items that it handled
+BENCHMARKS = {
+    "load_document": bench_load_document,
+    "canonical_node_by_id": bench_canonical_node_by_id,
+    "find_member": bench_find_member,
+    "MutationEngine.handle": bench_adjust,
+    "Renderer.invoke": bench_render,
+}
+
+
+def measure(benchmark, root, members, repeat=5):
+    """
+    Run the *benchmark* on the *root* *repeat* times and return its timings.
+
+    The benchmark is prepared again before each run so that nothing cached by
+    one run is used by the next.
+    """
+
+    times = []
+    for _ in range(repeat):
+        run = benchmark(root, members)
+        start = time.perf_counter()
+        items = run()
+        times.append(time.perf_counter() - start)
+
+    return {
+        "items": items,
+        "repeat": repeat,
+        "best": min(times),
+        "mean": statistics.mean(times),
+        "stdev": statistics.stdev(times) if len(times) > 1 else 0.0,
+        "best_per_item": min(times) / items if items else None,
+    }
+
+
+def run(parameters, repeat=5, names=None):
+    """
+    Generate a Doxygen XML output with *parameters* and benchmark it.
+
+    The *parameters* are sent to :func:`~benchmark.generate.generate`. Each
+    benchmark in *names* (or every benchmark in :data:`BENCHMARKS`) is run.
+    Return a map from the name of each benchmark to its timings.
+    """
+
+    with tempfile.TemporaryDirectory(prefix="aerate-benchmark-") as root:
+        members = generate(root, **parameters)
+        return {
+            name: measure(BENCHMARKS[name], root, members, repeat)
+            for name in (names or BENCHMARKS)
+        }
@@ -0,0 +1,61 @@
+"""
+A Sphinx extension that records the time and peak memory of each phase of a
+build to the JSON file in ``benchmark_phases_output``.
+
+The read phase runs from builder-inited to env-updated (so it includes the
+symbol index load and any prewarm) and the write phase from env-updated to
+build-finished.
+"""
+
+import json
+import resource
+import sys
+import time
+
+
+def peak_rss():
+    """Return the peak RSS in bytes of this process or any of its children."""
+
+    result = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                 resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # This is in kilobytes except on macOS
+    return result if sys.platform == "darwin" else result * 1024
+
+
+def on_builder_inited(sphinx):
+    sphinx.benchmark_phases = {"start": time.perf_counter(), "read_docs": 0}
+
+
+def on_env_before_read_docs(sphinx, env, docnames):
+    sphinx.benchmark_phases["read_docs"] = len(docnames)
+
+
+def on_env_updated(sphinx, env):
+    sphinx.benchmark_phases["read_end"] = time.perf_counter()
+
+
+def on_build_finished(sphinx, exception):
+    phases = sphinx.benchmark_phases
+    end = time.perf_counter()
+    if exception is not None or sphinx.config.benchmark_phases_output is None:
+        return
+
+    result = {
+        "read": phases["read_end"] - phases["start"],
+        "write": end - phases["read_end"],
+        "read_docs": phases["read_docs"],
+        "peak_rss": peak_rss(),
+    }
+    with open(sphinx.config.benchmark_phases_output, "w") as file:
+        json.dump(result, file)
+
+
+def setup(sphinx):
+    sphinx.add_config_value("benchmark_phases_output", None, "")
+
+    # This is before aerate's builder-inited handler (at priority 900)
+    sphinx.connect("builder-inited", on_builder_inited, priority=100)
+    sphinx.connect("env-before-read-docs", on_env_before_read_docs)
+    sphinx.connect("env-updated", on_env_updated, priority=900)
+    sphinx.connect("build-finished", on_build_finished)
+    return {"parallel_read_safe": True, "parallel_write_safe": True}
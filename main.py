@@ -5,30 +5,26 @@ SCRIPT_ROOT = os.path.dirname(os.path.realpath(__file__))
 
 aerate = Aerate(os.path.join(SCRIPT_ROOT, "xml"))
 
-item = aerate.index.find_member_by_name("vector_c")
-aerate.adjuster.handle(item.node)
-print(aerate.renderer.handle(item.node))
 
-item = aerate.index.find_member_by_name("vector_at", module="access.h")
-aerate.adjuster.handle(item.node)
-print(aerate.renderer.handle(item.node))
-
-item = aerate.index.find_member_by_name("vector_index", module="access.h")
-aerate.adjuster.handle(item.node)
-print(aerate.renderer.handle(item.node))
-
-item = aerate.index.find_member_by_name("vector_get", module="access.h")
-aerate.adjuster.handle(item.node)
-print(aerate.renderer.handle(item.node))
-
-item = aerate.index.find_member_by_name("vector_set", module="access.h")
-aerate.adjuster.handle(item.node)
-print(aerate.renderer.handle(item.node))
-
-item = aerate.index.find_member_by_name("vector_tail", module="access.h")
-aerate.adjuster.handle(item.node)
-print(aerate.renderer.handle(item.node))
-
-item = aerate.index.find_member_by_name("vector_insert_z", module="insert.h")
-aerate.adjuster.handle(item.node)
-print(aerate.renderer.handle(item.node))
+def find_member(name, module=None):
+    """Find the aeration of a member by *name* in the *module* compound."""
+
+    result = aerate.index.find_member(name)
+    if module is not None:
+        result = [id for id in result
+                  if aerate.index[aerate.index[id].parent].name == module]
+    if len(result) != 1:
+        raise LookupError(f"Can't find a single member {name!r}")
+    return aerate[result[0]]
+
+
+for name, module in [
+    ("vector_c", None),
+    ("vector_at", "access.h"),
+    ("vector_index", "access.h"),
+    ("vector_get", "access.h"),
+    ("vector_set", "access.h"),
+    ("vector_tail", "access.h"),
+    ("vector_insert_z", "insert.h"),
+]:
+    print(find_member(name, module).describe())
@@ -1,5 +1,9 @@
 from lxml import etree
+from aerate.aerate import Aerate
 from aerate.mutation import MutationCursor
+import os
+
+SAMPLE_ROOT = os.path.dirname(os.path.realpath(__file__))
 
 
 def SampleCursor(document: str, on: str=None):
@@ -30,3 +34,11 @@ class semantic:
             return NotImplemented
         text = etree.tostring(other, method="c14n2")
         return self.expected == text
+
+
+def SampleAerate(tmp_path, doxygen_root=None, **options):
+    """Return an aerate instance on the sample Doxygen XML in ``test/xml``."""
+
+    doxygen_root = doxygen_root or os.path.join(SAMPLE_ROOT, "xml")
+    options.setdefault("render_cache_size", "64M")
+    return Aerate(str(doxygen_root), cache_root=str(tmp_path), **options)
@@ -0,0 +1,256 @@
+from lxml import etree
+import copy
+import json
+import os
+import pytest
+import shutil
+
+from aerate.trace import TRACERS, Tracer, merge
+from test.sample import SAMPLE_ROOT, SampleAerate
+
+
+@pytest.fixture
+def aerate(tmp_path):
+    return SampleAerate(tmp_path)
+
+
+UNIQUE = "foo_8c_1a3b4c5d6e7f8091a23b4c5d6e7f8091a2"
+
+
+def test_find_member(aerate):
+    aeration = aerate.find_member("unique", kind="function")
+    assert aeration.id == UNIQUE
+    assert aeration.compound.id == "foo_8c"
+
+
+def test_find_member_ambiguous(aerate):
+    with pytest.raises(LookupError, match="Multiple"):
+        aerate.find_member("referrent", kind="function")
+
+
+def test_matter(aerate):
+    assert aerate[UNIQUE].matter.get("id") == UNIQUE
+    assert aerate["foo_8c"].matter.tag == "compounddef"
+
+
+def test_matter_after_eviction(tmp_path):
+    aerate = SampleAerate(tmp_path, document_cache_size=1)
+    matter = aerate[UNIQUE].matter
+    aerate["bar_8c"].matter
+    assert "foo_8c.xml" not in aerate.document_cache
+    assert aerate[UNIQUE].matter is not matter
+    assert aerate[UNIQUE].matter.get("id") == UNIQUE
+
+
+def test_node_after_eviction(tmp_path):
+    aerate = SampleAerate(tmp_path, document_cache_size=1)
+    node = aerate[UNIQUE].node
+    assert node.get("refid") == UNIQUE
+    assert "canonical_nodes" in aerate.document_cache.get("index.xml").memo
+
+    # The map of each id to its node is released with index.xml
+    aerate["bar_8c"].matter
+    assert "index.xml" not in aerate.document_cache
+    assert aerate[UNIQUE].node is not node
+    assert aerate[UNIQUE].node.get("refid") == UNIQUE
+
+
+def test_adjust_once(aerate):
+    handled = []
+    handle = aerate.adjuster.handle
+    aerate.adjuster.handle = lambda node: handled.append(node) or handle(node)
+
+    matter = aerate[UNIQUE].adjust()
+    assert aerate[UNIQUE].adjust() is matter
+    assert len(handled) == 1
+
+    aerate[UNIQUE].adjust(force=True)
+    assert len(handled) == 2
+
+
+def test_adjust_compound(aerate):
+    handled = []
+    handle = aerate.adjuster.handle
+    aerate.adjuster.handle = lambda node: handled.append(node) or handle(node)
+
+    matter = aerate["foo_8c"].adjust()
+    assert aerate[UNIQUE].adjust() is matter.find(f".//*[@id='{UNIQUE}']")
+    assert len(handled) == 1
+
+
+def test_find_compound(aerate):
+    assert aerate.find_compound("bar.c", kind="file").id == "bar_8c"
+    assert aerate.find_compound("sample", kind="group").id == "group__sample"
+    assert aerate.find_compound("subdir_2foo_8c").id == "subdir_2foo_8c"
+
+    with pytest.raises(LookupError, match="Multiple"):
+        aerate.find_compound("foo.c", kind="file")
+    with pytest.raises(LookupError, match="No <compound>"):
+        aerate.find_compound("bar.c", kind="group")
+
+
+def test_find_memberdef_missing(aerate):
+    with pytest.raises(LookupError, match="No <memberdef>"):
+        aerate["foo_8c"].find_memberdef("foo_8c_1missing")
+
+
+def test_find_memberdef_duplicate(tmp_path):
+    root = tmp_path / "xml"
+    shutil.copytree(f"{SAMPLE_ROOT}/xml", root)
+    document = etree.parse(str(root / "foo_8c.xml"))
+    (memberdef,) = document.xpath("//memberdef[@id=$id]", id=UNIQUE)
+    memberdef.addnext(copy.deepcopy(memberdef))
+    document.write(str(root / "foo_8c.xml"))
+
+    aerate = SampleAerate(tmp_path, doxygen_root=str(root))
+    with pytest.raises(LookupError, match="Multiple <memberdef>s"):
+        aerate["foo_8c"].find_memberdef(UNIQUE)
+    with pytest.raises(LookupError, match="Multiple <memberdef>s"):
+        aerate[UNIQUE].matter
+
+
+def test_adjust_after_rule(aerate):
+    aerate[UNIQUE].adjust()
+
+    @aerate.adjuster.rule("briefdescription")
+    def remove_briefdescription(self, cursor):
+        return cursor.remove()
+
+    matter = aerate[UNIQUE].adjust()
+    assert matter.find("briefdescription") is None
+    assert matter.find("detaileddescription") is not None
+
+
+def test_describe(aerate):
+    output = aerate[UNIQUE].describe()
+    assert output
+    assert aerate.render_cache.misses == 1
+
+
+def test_describe_cached(tmp_path):
+    output = SampleAerate(tmp_path)[UNIQUE].describe()
+
+    aerate = SampleAerate(tmp_path)
+    assert aerate[UNIQUE].describe() == output
+    assert aerate.render_cache.hits == 1
+    assert ("adjusted", UNIQUE) not in aerate[UNIQUE].entry.memo
+
+
+def test_describe_after_rule(tmp_path):
+    SampleAerate(tmp_path)[UNIQUE].describe()
+
+    aerate = SampleAerate(tmp_path)
+
+    @aerate.renderer.rule("briefdescription", before=True)
+    def render_briefdescription(self, node, before=""):
+        return "Replaced."
+
+    assert aerate[UNIQUE].describe().startswith("Replaced.")
+    assert aerate.render_cache.hits == 0
+
+
+def test_describe_after_anchor(tmp_path):
+    SampleAerate(tmp_path)[UNIQUE].describe()
+
+    aerate = SampleAerate(tmp_path)
+    macro = aerate.find_member("SAMPLE_MACRO", kind="define")
+    aerate.anchors[macro.id] = "SAMPLE_MACRO_anchor"
+
+    assert "SAMPLE_MACRO_anchor" in aerate[UNIQUE].describe()
+
+
+def test_describe_nodes(tmp_path):
+    from docutils import nodes
+    from sphinx import addnodes
+
+    aerate = SampleAerate(tmp_path)
+    output = aerate[UNIQUE].describe(as_nodes=True)
+    assert all(isinstance(node, nodes.Body) for node in output)
+
+    document = nodes.container("", *output)
+    xrefs = {node["reftarget"]: node["reftype"]
+             for node in document.traverse(addnodes.pending_xref)}
+    assert xrefs["unique"] == "func"
+    assert xrefs["sample_t"] == "type"
+    assert xrefs["SAMPLE_MACRO"] == "macro"
+    (fields,) = document.traverse(nodes.field_list)
+    assert [field[0].astext() for field in fields] == ["param b", "return"]
+    assert "\\" not in document.astext()
+
+    # The nodes are stored apart from the reST description
+    aerate = SampleAerate(tmp_path)
+    stored = aerate[UNIQUE].describe(as_nodes=True)
+    assert [node.pformat() for node in stored] == \
+        [node.pformat() for node in output]
+    assert aerate.render_cache.hits == 1
+    aerate[UNIQUE].describe()
+    assert aerate.render_cache.misses == 1
+
+
+def test_describe_nodes_parentheses(tmp_path):
+    from aerate.nodes import add_function_parentheses
+    from sphinx import addnodes
+    from types import SimpleNamespace
+
+    def functions(output):
+        return [node.astext() for item in output
+                for node in item.traverse(addnodes.pending_xref)
+                if node["reftype"] == "func"]
+
+    # The parentheses aren't stored, so a stored description can be used
+    # whether add_function_parentheses is true or not
+    output = SampleAerate(tmp_path)[UNIQUE].describe(as_nodes=True)
+    assert "unique" in functions(output)
+    add_function_parentheses(
+        output, SimpleNamespace(add_function_parentheses=True))
+    assert "unique()" in functions(output)
+
+    output = SampleAerate(tmp_path)[UNIQUE].describe(as_nodes=True)
+    add_function_parentheses(
+        output, SimpleNamespace(add_function_parentheses=False))
+    assert "unique" in functions(output)
+
+
+def test_describe_traced(tmp_path):
+    aerate = SampleAerate(tmp_path)
+    aerate.tracer = Tracer(str(tmp_path / "trace"))
+    aerate.tracer.context["docname"] = "index"
+    aerate[UNIQUE].describe()
+    aerate.tracer.flush()
+
+    path = tmp_path / "trace.json"
+    assert merge(str(tmp_path / "trace"), str(path)) > 0
+    events = json.loads(path.read_text())["traceEvents"]
+    names = {event["name"] for event in events if event["ph"] == "X"}
+    assert {"load_document", "retrieve_matter", "adjust", "render"} <= names
+    assert all(event["args"]["docname"] == "index"
+               for event in events if event["ph"] == "X")
+
+
+def test_trace_after_fork(tmp_path):
+    tracer = Tracer(str(tmp_path / "trace"))
+    with tracer.span("parent"):
+        pass
+
+    pid = os.fork()
+    if not pid:
+        os._exit(len(tracer.events))
+    assert os.waitstatus_to_exitcode(os.waitpid(pid, 0)[1]) == 0
+    assert len(tracer.events) == 1
+    assert tracer in TRACERS
+
+
+def test_stats(aerate):
+    aerate[UNIQUE].describe()
+    stats = aerate.stats()
+
+    documents = stats["document_cache"]
+    assert documents["parsed"] == documents["misses"]
+    assert documents["parsed_bytes"] >= documents["bytes"]
+    assert stats["render_cache"]["misses"] == 1
+    assert stats["aeration_memo"]["entries"] >= 2
+
+    (largest, *_) = stats["largest_documents"]
+    assert largest["name"] == "foo_8c.xml"
+    assert largest["elements"] > 0
+    assert documents["elements"] >= largest["elements"]
@@ -0,0 +1,43 @@
+from aerate.aerate import Aerate
+from benchmark import e2e, micro
+from benchmark.generate import generate
+
+
+def test_generate(tmp_path):
+    members = generate(str(tmp_path), compounds=3, members=4, depth=2,
+                       markup=0.5, refs=2)
+    assert len(members) == 12
+    assert generate(str(tmp_path / "again"), compounds=3, members=4, depth=2,
+                    markup=0.5, refs=2) == members
+
+    aerate = Aerate(str(tmp_path))
+    for id, kind, name in members:
+        aeration = aerate.find_member(name, kind)
+        assert aeration.id == id
+        assert aeration.describe()
+
+
+def test_micro():
+    results = micro.run({"compounds": 2, "members": 3}, repeat=1)
+    assert list(results) == list(micro.BENCHMARKS)
+    assert results["find_member"]["items"] == 6
+
+
+def test_e2e_compare():
+    baseline = {"members": 100, "full": {"read": 1.0, "peak_rss": 100},
+                "touch": {"read": 0.01, "read_docs": 0}}
+    results = {"members": 100, "full": {"read": 1.3, "peak_rss": 105},
+               "touch": {"read": 0.03, "read_docs": 1}}
+    assert e2e.compare(results, baseline) == [("full.read", 1.0, 1.3)]
+    assert e2e.compare(results, baseline, memory_threshold=0.01) == [
+        ("full.read", 1.0, 1.3), ("full.peak_rss", 100, 105)]
+
+
+def test_e2e_prewarm():
+    # A build that doesn't read any documents again doesn't prewarm
+    baseline = e2e.run(members=20, per_compound=10)
+    results = e2e.run(members=20, per_compound=10, prewarm=2)
+    assert results["touch"]["read_docs"] == 0
+    assert not e2e.compare({"touch": results["touch"]},
+                           {"touch": baseline["touch"]},
+                           time_threshold=1.0)
@@ -0,0 +1,100 @@
+import os
+import pytest
+
+from aerate.cache import DocumentCache, RenderCache, parse_cache_size
+
+
+def test_get_missing():
+    cache = DocumentCache()
+    assert cache.get("a.xml") is None
+    assert cache.misses == 1
+
+
+def test_get_hit():
+    cache = DocumentCache()
+    entry = cache.put("a.xml", "a")
+    assert cache.get("a.xml") is entry
+    assert entry.document == "a"
+    assert cache.hits == 1
+
+
+def test_evict_documents():
+    cache = DocumentCache(documents=2)
+    cache.put("a.xml", "a")
+    cache.put("b.xml", "b")
+    cache.get("a.xml")
+    cache.put("c.xml", "c")
+    assert "a.xml" in cache and "c.xml" in cache
+    assert "b.xml" not in cache
+    assert cache.evictions == 1
+
+
+def test_evict_size():
+    cache = DocumentCache(size=10)
+    cache.put("a.xml", "a", 6)
+    cache.put("b.xml", "b", 6)
+    assert list(cache.entries) == ["b.xml"]
+    assert cache.total == 6
+
+
+def test_evict_keeps_newest():
+    cache = DocumentCache(size=10)
+    cache.put("a.xml", "a", 6)
+    cache.put("b.xml", "b", 20)
+    assert list(cache.entries) == ["b.xml"]
+
+
+def test_parse_cache_size():
+    assert parse_cache_size(None) == (None, None)
+    assert parse_cache_size(64) == (64, None)
+    assert parse_cache_size("512") == (None, 512)
+    assert parse_cache_size("4K") == (None, 4096)
+    assert parse_cache_size("2mb") == (None, 2 * 1024 ** 2)
+    with pytest.raises(ValueError):
+        parse_cache_size("many")
+
+
+def test_render_cache(tmp_path):
+    cache = RenderCache(str(tmp_path))
+    assert cache.get("abcd") is None
+    cache.put("abcd", ({}, "text"))
+    assert cache.get("abcd") == ({}, "text")
+    assert RenderCache(str(tmp_path)).get("abcd") == ({}, "text")
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_render_cache_evict(tmp_path):
+    cache = RenderCache(str(tmp_path), documents=3)
+    for i, key in enumerate(("aa", "bb", "cc")):
+        cache.put(key, key)
+        os.utime(cache.path(key), (i, i))
+    cache.get("aa")
+    cache.put("dd", "dd")
+    assert cache.evictions == 1
+    assert cache.get("bb") is None
+    assert [cache.get(key) for key in ("aa", "cc", "dd")] == ["aa", "cc", "dd"]
+
+
+def test_render_cache_disabled(tmp_path):
+    cache = RenderCache(str(tmp_path), size=0)
+    cache.put("abcd", "text")
+    assert cache.get("abcd") is None
+    assert not os.listdir(tmp_path)
+
+
+def test_render_cache_retain(tmp_path):
+    cache = RenderCache(str(tmp_path), documents=2)
+    for i, key in enumerate(("aa", "bb")):
+        cache.put(key, key)
+        os.utime(cache.path(key), (i, i))
+
+    # A forked process doesn't evict entries from the cache
+    cache.pid = None
+    cache.put("cc", "cc")
+    assert cache.evictions == 0
+
+    cache.pid = os.getpid()
+    cache.retain({"aa"})
+    assert cache.evictions == 1
+    assert cache.get("bb") is None
+    assert cache.get("aa") == "aa" and cache.get("cc") == "cc"
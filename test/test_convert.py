@@ -0,0 +1,72 @@
+import os
+
+from aerate.__main__ import main
+from aerate import convert
+from aerate.convert import convert_compound
+from aerate.prewarm import shard
+from test.sample import SAMPLE_ROOT, SampleAerate
+
+
+def test_convert_compound(tmp_path):
+    aerate = SampleAerate(tmp_path)
+    name, text, errors = convert_compound(aerate, shard(aerate)["foo_8c.xml"])
+
+    assert name == "foo_8c.rst" and not errors
+    assert text.startswith("foo.c\n=====\n")
+    assert ".. c:function:: int unique(int b)" in text
+    assert ".. c:macro:: SAMPLE_MACRO(a, b)" in text
+
+
+def test_convert_compound_description(tmp_path):
+    aerate = SampleAerate(tmp_path)
+    name, text, errors = convert_compound(
+        aerate, shard(aerate)["group__sample.xml"])
+
+    assert name == "group__sample.rst" and not errors
+    assert text == "sample\n======\n\nA sample group.\n"
+
+
+def test_convert_compound_empty(tmp_path):
+    aerate = SampleAerate(tmp_path)
+    ids = next(ids for ids in shard(aerate).values()
+               if len(ids) == 1 and aerate[ids[0]].kind == "dir")
+    assert convert_compound(aerate, ids)[1:] == (None, [])
+
+
+def test_main(tmp_path, capsys):
+    output = tmp_path / "output"
+    assert main([f"{SAMPLE_ROOT}/xml", str(output), "-j", "1"]) == 0
+    assert (output / "foo_8c.rst").exists()
+    assert str(output / "foo_8c.rst") in capsys.readouterr().out
+
+    # An unchanged file isn't written again
+    assert main([f"{SAMPLE_ROOT}/xml", str(output), "-j", "1"]) == 0
+    assert capsys.readouterr().out == ""
+
+
+def test_main_cache_size(tmp_path):
+    cache = tmp_path / "cache"
+    assert main([f"{SAMPLE_ROOT}/xml", str(tmp_path / "output"), "-j", "1",
+                 "--cache", str(cache), "--cache-size", "1K"]) == 0
+
+    sizes = [path.stat().st_size for path in cache.rglob("*.pickle")]
+    assert sizes and sum(sizes) <= 1024
+
+
+def test_main_cache_disabled(tmp_path):
+    cache = tmp_path / "cache"
+    assert main([f"{SAMPLE_ROOT}/xml", str(tmp_path / "output"), "-j", "1",
+                 "--cache", str(cache), "--cache-size", "0"]) == 0
+    assert not list(cache.rglob("*.pickle"))
+
+
+def test_worker_cache(tmp_path):
+    # A worker doesn't scan or evict from the cache that it shares
+    convert.initialize(f"{SAMPLE_ROOT}/xml", str(tmp_path), {},
+                       (1, None), os.getppid())
+    worker = convert.worker
+    worker.find_member("unique", kind="function").describe()
+    worker.find_member("SAMPLE_MACRO", kind="define").describe()
+
+    assert worker.render_cache.count is None
+    assert len(list(tmp_path.rglob("*.pickle"))) == 2
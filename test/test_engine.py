@@ -0,0 +1,243 @@
+from lxml import etree
+import os
+import subprocess
+import sys
+import textwrap
+
+from aerate.engine import Engine, Renderer, WithinMatcher
+from aerate.profile import PROFILERS, Profiler
+from aerate.writer import Writer
+from test.sample import SAMPLE_ROOT
+
+
+def test_candidates():
+    engine = Engine(None)
+
+    @engine.rule("a")
+    def first(self, node):
+        pass
+
+    @engine.rule
+    def second(self, node):
+        pass
+
+    @engine.rule("b")
+    def third(self, node):
+        pass
+
+    assert [rule.name for rule in engine.candidates("a")] == [
+        "first", "second"]
+    assert [rule.name for rule in engine.candidates("b")] == [
+        "second", "third"]
+    assert [rule.name for rule in engine.candidates("c")] == ["second"]
+
+
+def test_candidates_after_rule():
+    engine = Engine(None)
+
+    @engine.rule("a")
+    def first(self, node):
+        pass
+
+    assert [rule.name for rule in engine.candidates("a")] == ["first"]
+
+    @engine.rule("a", before=True)
+    def second(self, node):
+        pass
+
+    assert [rule.name for rule in engine.candidates("a")] == [
+        "second", "first"]
+
+
+def test_invoke_fall_through():
+    engine = Engine(None)
+
+    @engine.rule("a")
+    def first(self, node):
+        return NotImplemented
+
+    @engine.rule(when=lambda node: node.text)
+    def second(self, node):
+        return "second"
+
+    @engine.rule("a")
+    def third(self, node):
+        return "third"
+
+    assert engine.invoke(etree.fromstring("<a>text</a>")) == "second"
+    assert engine.invoke(etree.fromstring("<a/>")) == "third"
+    assert engine.invoke(etree.fromstring("<b/>")) is None
+
+
+def test_invoke_profiled():
+    engine = Engine(None)
+
+    @engine.rule("a")
+    def first(self, node):
+        return NotImplemented
+
+    @engine.rule(when=lambda node: node.text)
+    def second(self, node):
+        return "".join(self.invoke(item) for item in node) or "second"
+
+    profiler = Profiler()
+    profiler.instrument("engine", engine)
+    root = etree.fromstring("<a>text<b>text</b></a>")
+    assert engine.invoke(root) == "second"
+
+    stats = profiler.as_dict()["engine"]
+    assert stats["first"]["evaluated"] == 1
+    assert stats["first"]["invoked"] == stats["first"]["declined"] == 1
+    assert stats["second"]["evaluated"] == stats["second"]["accepted"] == 2
+    assert stats["second"]["invoked"] == 2
+    assert stats["second"]["declined"] == 0
+    assert stats["second"]["self_time"] <= stats["second"]["time"]
+
+    merged = Profiler()
+    merged.merge(profiler)
+    merged.merge(profiler)
+    assert merged.as_dict()["engine"]["second"]["invoked"] == 4
+
+    profiler.clear()
+    assert profiler.as_dict()["engine"]["second"]["invoked"] == 0
+
+    engine.instrument(None)
+    assert engine.candidates("a") == engine.script
+
+
+def test_profile_after_fork():
+    engine = Engine(None)
+    engine.rule("a")(lambda self, node: None)
+    profiler = Profiler()
+    profiler.instrument("engine", engine)
+    engine.invoke(etree.fromstring("<a/>"))
+
+    pid = os.fork()
+    if not pid:
+        invoked = profiler.as_dict()["engine"]["<lambda>"]["invoked"]
+        os._exit(invoked)
+    assert os.waitstatus_to_exitcode(os.waitpid(pid, 0)[1]) == 0
+    assert profiler.as_dict()["engine"]["<lambda>"]["invoked"] == 1
+    assert profiler in PROFILERS
+
+
+def test_render_into_writer():
+    engine = Renderer(None)
+
+    @engine.rule("list")
+    def render_list(self, node):
+        for item in node:
+            self.emit(item)
+
+    @engine.rule("item")
+    def render_item(self, node):
+        self.writer.write("- ")
+        with self.writer.indent("  "), self.writer.stripped():
+            for item in node:
+                self.emit(item)
+        self.writer.write("\n")
+
+    @engine.rule("text")
+    def render_text(self, node):
+        return f"\n{node.text}\n  \n"
+
+    node = etree.fromstring(
+        "<list><item><text>a</text><text>b</text></item>"
+        "<item><item><text>c</text></item></item><item/></list>")
+    assert engine.invoke(node) == "- a\n  \n\n  b\n- - c\n- \n"
+
+
+def test_writer_like_textwrap():
+    text = "first\n\n  second \n \nthird  \n\n"
+
+    writer = Writer()
+    writer.write("> ")
+    with writer.indent("    "), writer.stripped():
+        writer.write(text[:9])
+        writer.write(text[9:])
+    writer.write("|\n")
+    with writer.indent("  "):
+        writer.write(text)
+    with writer.stripped(leading=False):
+        writer.write("  \n ")
+
+    assert writer.getvalue() == (
+        "> " + textwrap.indent(text, "    ").strip() + "|\n"
+        + textwrap.indent(text, "  "))
+
+
+def test_within_matcher():
+    node = etree.fromstring("<c><b><a><node/></a></b></c>")[0][0][0]
+
+    for within in ("a", "b", "c", "a/b", "a/c", "b/c", "a/b/c"):
+        assert WithinMatcher([within])(node), within
+
+    for within in ("d", "b/a", "c/a", "a/d", "a/b/c/d"):
+        assert not WithinMatcher([within])(node), within
+
+    assert WithinMatcher(["d", "b/c"])(node)
+
+
+def test_within_matcher_memo():
+    matcher = WithinMatcher(["a/b"])
+    root = etree.fromstring("<b><a><x/><y/></a><x/></b>")
+
+    assert matcher(root[0][0])
+    assert matcher(root[0][1])
+    assert not matcher(root[1])
+    assert matcher.memo == {("a", "b"): True, ("b",): False}
+
+
+def test_ancestry():
+    engine = Engine(None)
+    root = etree.fromstring("<b><a><x/></a></b>")
+    found = []
+
+    @engine.rule("x", within="c")
+    def within_c(self, node):
+        pass
+
+    @engine.rule("x", within="a")
+    def within_a(self, node):
+        found.append(dict(self.ancestries))
+
+    engine.invoke(root[0][0])
+    assert found == [{root[0][0]: ("a", "b"), root[0]: ("b",), root: ()}]
+    assert not engine.ancestries
+    assert engine.script[0].matcher.memo == {("a", "b"): False}
+
+
+def test_fingerprint():
+    def build(when):
+        engine = Engine(None)
+        engine.rule("a", within="b", when=when)(lambda self, node: None)
+        return engine
+
+    assert build("./c").fingerprint == build("./c").fingerprint
+    assert build("./c").fingerprint != build("./d").fingerprint
+
+    engine = build("./c")
+    fingerprint = engine.fingerprint
+    engine.rule("d")(lambda self, node: None)
+    assert engine.fingerprint != fingerprint
+
+
+FINGERPRINT = """
+from aerate.aerate import Aerate
+aerate = Aerate(%r)
+aerate.renderer.rule("a", when=lambda node: node.get("b") in {
+    "c", "d", "e", "f", "g", "h"})(lambda self, node: None)
+print(aerate.fingerprint)
+"""
+
+
+def test_fingerprint_hash_seed():
+    # The fingerprint (of a rule with a set too) doesn't depend on the hash
+    # seed of the process
+    code = FINGERPRINT % os.path.join(SAMPLE_ROOT, "xml")
+    output = {subprocess.run(
+        [sys.executable, "-c", code], check=True, capture_output=True,
+        text=True, cwd=os.path.dirname(SAMPLE_ROOT),
+        env=dict(os.environ, PYTHONHASHSEED=str(seed))).stdout
+        for seed in range(4)}
+    assert len(output) == 1
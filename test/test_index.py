@@ -0,0 +1,215 @@
+from lxml import etree
+import pytest
+
+from aerate.index import SymbolIndex, canonical_nodes
+
+
+def SampleDocument(text):
+    parser = etree.XMLParser(remove_blank_text=True)
+    return etree.ElementTree(etree.fromstring(text, parser))
+
+
+def SampleIndex(text):
+    """Return a symbol index of the ``index.xml`` document ``text``."""
+    return SymbolIndex.from_document(SampleDocument(text))
+
+
+def test_canonical_node_compound():
+    nodes = canonical_nodes(SampleDocument("""
+        <doxygenindex>
+            <compound refid="foo_8c" kind="file"><name>foo.c</name></compound>
+        </doxygenindex>
+    """))
+    assert nodes["foo_8c"].tag == "compound"
+
+
+def test_symbol_missing():
+    index = SampleIndex("<doxygenindex/>")
+    with pytest.raises(LookupError):
+        index["foo_8c"]
+
+
+def test_canonical_node_prefix():
+    nodes = canonical_nodes(SampleDocument("""
+        <doxygenindex>
+            <compound refid="group__a" kind="group">
+                <member refid="foo_8c_1a" kind="function"/>
+            </compound>
+            <compound refid="foo_8c" kind="file">
+                <member refid="foo_8c_1a" kind="function"/>
+            </compound>
+        </doxygenindex>
+    """))
+    node = nodes["foo_8c_1a"]
+    assert node.getparent().get("refid") == "foo_8c"
+
+
+def test_canonical_node_longest_prefix():
+    nodes = canonical_nodes(SampleDocument("""
+        <doxygenindex>
+            <compound refid="foo" kind="file">
+                <member refid="foo_8c_1a" kind="function"/>
+            </compound>
+            <compound refid="foo_8c" kind="file">
+                <member refid="foo_8c_1a" kind="function"/>
+            </compound>
+        </doxygenindex>
+    """))
+    node = nodes["foo_8c_1a"]
+    assert node.getparent().get("refid") == "foo_8c"
+
+
+def test_canonical_node_last_resort():
+    nodes = canonical_nodes(SampleDocument("""
+        <doxygenindex>
+            <compound refid="group__a" kind="group">
+                <member refid="foo_8c_1a" kind="function"/>
+            </compound>
+            <compound refid="group__b" kind="group">
+                <member refid="foo_8c_1a" kind="function"/>
+            </compound>
+        </doxygenindex>
+    """))
+    node = nodes["foo_8c_1a"]
+    assert node.getparent().get("refid") == "group__a"
+
+
+def test_find_member():
+    index = SampleIndex("""
+        <doxygenindex>
+            <compound refid="group__a" kind="group">
+                <member refid="foo_8c_1a" kind="function"><name>a</name>
+                </member>
+            </compound>
+            <compound refid="foo_8c" kind="file">
+                <member refid="foo_8c_1a" kind="function"><name>a</name>
+                </member>
+                <member refid="foo_8c_1b" kind="define"><name>a</name></member>
+            </compound>
+        </doxygenindex>
+    """)
+    assert index.find_member("a", "function") == ["foo_8c_1a"]
+    assert index.find_member("a", "define") == ["foo_8c_1b"]
+    assert index.find_member("a") == ["foo_8c_1a", "foo_8c_1b"]
+    assert index.find_member("a", "typedef") == []
+    assert index.find_member("b") == []
+
+
+def test_find_compound():
+    index = SampleIndex("""
+        <doxygenindex>
+            <compound refid="foo_8c" kind="file"><name>foo.c</name>
+            </compound>
+            <compound refid="dir_2foo_8c" kind="file"><name>foo.c</name>
+            </compound>
+            <compound refid="group__foo" kind="group"><name>foo.c</name>
+                <member refid="foo_8c_1a" kind="function"><name>a</name>
+                </member>
+            </compound>
+        </doxygenindex>
+    """)
+    assert index.find_compound("foo.c", "file") == ["foo_8c", "dir_2foo_8c"]
+    assert index.find_compound("foo.c", "group") == ["group__foo"]
+    assert index.find_compound("foo.c") == [
+        "foo_8c", "dir_2foo_8c", "group__foo"]
+    assert index.find_compound("a") == []
+    assert index.find_member("foo.c") == []
+
+
+def test_symbol():
+    index = SampleIndex("""
+        <doxygenindex>
+            <compound refid="group__a" kind="group"><name>a</name>
+                <member refid="foo_8c_1a" kind="function"><name>a</name>
+                </member>
+            </compound>
+            <compound refid="foo_8c" kind="file"><name>foo.c</name>
+                <member refid="foo_8c_1a" kind="function"><name>a</name>
+                </member>
+            </compound>
+        </doxygenindex>
+    """)
+    assert index["foo_8c"] == ("foo_8c", "compound", "file", "foo.c", None)
+    assert index["foo_8c_1a"].parent == "foo_8c"
+
+
+def test_dump_and_load(tmp_path):
+    index = SampleIndex("""
+        <doxygenindex>
+            <compound refid="foo_8c" kind="file"><name>foo.c</name>
+                <member refid="foo_8c_1a" kind="function"><name>a</name>
+                </member>
+            </compound>
+        </doxygenindex>
+    """)
+    path = str(tmp_path / "index.bin")
+    index.dump(path, "digest")
+
+    loaded = SymbolIndex.load(path, "digest")
+    assert loaded.symbols == index.symbols
+    assert loaded.find_member("a", "function") == ["foo_8c_1a"]
+
+    assert SymbolIndex.load(path, "changed") is None
+    assert SymbolIndex.load(str(tmp_path / "missing.bin"), "digest") is None
+
+
+def test_load_truncated(tmp_path):
+    index = SampleIndex("""
+        <doxygenindex>
+            <compound refid="foo_8c" kind="file"><name>foo.c</name>
+                <member refid="foo_8c_1a" kind="function"><name>a</name>
+                </member>
+            </compound>
+        </doxygenindex>
+    """)
+    path = tmp_path / "index.bin"
+    index.dump(str(path), "digest")
+    data = path.read_bytes()
+
+    # Cut off in the string table, in the tables, in the digest, and in the
+    # header (or empty)
+    for size in (len(data) - 1, len(data) // 2 + 1, 35, 30, 0):
+        path.write_bytes(data[:size])
+        assert SymbolIndex.load(str(path), "digest") is None
+
+    path.write_bytes(b"X" + data[1:])
+    assert SymbolIndex.load(str(path), "digest") is None
+
+
+def test_mapped_index(tmp_path):
+    index = SampleIndex("""
+        <doxygenindex>
+            <compound refid="foo_8c" kind="file"><name>foo.c</name>
+                <member refid="foo_8c_1b" kind="function"><name>b</name>
+                </member>
+                <member refid="foo_8c_1a" kind="define"><name>a</name>
+                </member>
+                <member refid="foo_8c_1c" kind="function"><name>ä</name>
+                </member>
+            </compound>
+            <compound refid="bar_8c" kind="file"><name>bar.c</name>
+                <member refid="bar_8c_1a" kind="function"><name>a</name>
+                </member>
+            </compound>
+        </doxygenindex>
+    """)
+    path = str(tmp_path / "index.bin")
+    index.dump(path, "digest")
+    loaded = SymbolIndex.load(path, "digest")
+
+    assert list(loaded) == list(index)
+    assert "bar_8c_1a" in loaded and "bar_8c_1b" not in loaded
+    assert loaded["foo_8c_1c"] == index["foo_8c_1c"]
+    with pytest.raises(LookupError):
+        loaded["bar_8c_1b"]
+
+    assert loaded.find_member("a") == ["foo_8c_1a", "bar_8c_1a"]
+    assert loaded.find_member("a", "function") == ["bar_8c_1a"]
+    assert loaded.find_member("ä", "function") == ["foo_8c_1c"]
+    assert loaded.find_member("b", "define") == []
+    assert loaded.find_member("c") == []
+
+    assert loaded.find_compound("foo.c") == ["foo_8c"]
+    assert loaded.find_compound("bar.c", "file") == ["bar_8c"]
+    assert loaded.find_compound("bar.c", "group") == []
+    assert loaded.find_compound("a") == []
@@ -0,0 +1,116 @@
+import pytest
+import shutil
+
+from aerate.manifest import Manifest, ReferenceGraph
+from test.sample import SAMPLE_ROOT, SampleAerate
+
+
+@pytest.fixture
+def root(tmp_path):
+    shutil.copytree(f"{SAMPLE_ROOT}/xml", tmp_path / "xml")
+    return tmp_path / "xml"
+
+
+def record(tmp_path, root):
+    aerate = SampleAerate(tmp_path, doxygen_root=root)
+    manifest = Manifest()
+    aeration = aerate.find_member("SAMPLE_MACRO", kind="define")
+    manifest.record_lookup("SAMPLE_MACRO", "define", aeration)
+    manifest.record_definition(aeration)
+    manifest.record_lookup("missing", "function", None)
+    return manifest
+
+
+def replace(path, old, new):
+    text = path.read_text()
+    assert old in text
+    path.write_text(text.replace(old, new))
+
+
+def test_unchanged(tmp_path, root):
+    manifest = record(tmp_path, root)
+    aerate = SampleAerate(tmp_path, doxygen_root=root)
+    assert not manifest.is_outdated(aerate)
+
+
+def test_changed_elsewhere(tmp_path, root):
+    manifest = record(tmp_path, root)
+    replace(root / "foo_8c.xml", "a referrent.", "one referrent.")
+    aerate = SampleAerate(tmp_path, doxygen_root=root)
+    assert not manifest.is_outdated(aerate)
+
+
+def test_changed_definition(tmp_path, root):
+    manifest = record(tmp_path, root)
+    replace(root / "foo_8c.xml", "Add <emphasis>", "Sum <emphasis>")
+    aerate = SampleAerate(tmp_path, doxygen_root=root)
+    assert manifest.is_outdated(aerate)
+
+
+def test_changed_lookup(tmp_path, root):
+    manifest = record(tmp_path, root)
+    replace(root / "index.xml", "<name>unique</name>", "<name>missing</name>")
+    aerate = SampleAerate(tmp_path, doxygen_root=root)
+    assert manifest.is_outdated(aerate)
+
+
+def test_changed_compound_lookup(tmp_path, root):
+    aerate = SampleAerate(tmp_path, doxygen_root=root)
+    manifest = Manifest()
+    manifest.record_compound_lookup(
+        "bar.c", "file", aerate.find_compound("bar.c", kind="file"))
+    assert not manifest.is_outdated(SampleAerate(tmp_path, doxygen_root=root))
+
+    replace(root / "index.xml", "<name>bar.c</name>", "<name>baz.c</name>")
+    aerate = SampleAerate(tmp_path, doxygen_root=root)
+    assert manifest.is_outdated(aerate)
+
+
+def test_reference_graph(tmp_path):
+    aerate = SampleAerate(tmp_path)
+    macro = aerate.find_member("SAMPLE_MACRO", kind="define").id
+
+    graph = ReferenceGraph()
+    graph.record("a", macro, aerate.resolve(macro))
+    graph.record("b", macro, aerate.resolve(macro))
+    graph.record("b", "nosuchrefid", None)
+    assert not graph.find_outdated(aerate)
+
+    aerate = SampleAerate(tmp_path)
+    aerate.anchors[macro] = "MACRO"
+    assert graph.find_outdated(aerate) == {"a", "b"}
+
+    graph.purge("a")
+    assert set(graph.referrers[macro]) == {"b"}
+    assert graph.find_outdated(aerate) == {"b"}
+
+
+def test_reference_graph_merge():
+    graph, other = ReferenceGraph(), ReferenceGraph()
+    other.record("a", "x", ("function", "x", "x"))
+    other.record("b", "x", ("function", "x", "x"))
+    graph.merge(other, {"a"})
+    assert graph.referrers == {"x": {"a": ("function", "x", "x")}}
+    assert graph.references == {"a": {"x"}}
+
+
+def test_reference_graph_intern():
+    graph = ReferenceGraph()
+    graph.record("a", "x", ("function", "x", "x"))
+    graph.record("b", "x", ("function", "x", "x"))
+    assert graph.referrers["x"]["a"] is graph.referrers["x"]["b"]
+
+
+def test_env_get_outdated_without_index(tmp_path, root):
+    from aerate.sphinx import on_env_get_outdated
+    from types import SimpleNamespace
+
+    manifest = record(tmp_path, root)
+    sphinx = SimpleNamespace(
+        aerate=None, config=SimpleNamespace(aerate_doxygen_root=str(root)))
+    env = SimpleNamespace(aerate_manifests={"index": manifest})
+
+    (root / "index.xml").unlink()
+    assert on_env_get_outdated(sphinx, env, set(), set(), set()) == []
+    assert sphinx.aerate is None
+    assert env.aerate_manifests == {"index": manifest}
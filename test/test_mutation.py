@@ -1,6 +1,6 @@
 from lxml import etree
 
-from aerate.mutation import MutationCursor
+from aerate.mutation import MutationCursor, MutationEngine
 from test.sample import SampleCursor, semantic
 
 
@@ -92,3 +92,111 @@ def test_remove():
     cursor = SampleCursor("<root><a/><cursor/><c/></root>")
     cursor.remove()
     assert cursor.node.tag == "c"
+
+
+def test_engine_next_rule():
+    engine = MutationEngine(None)
+    called = []
+
+    @engine.rule("a")
+    def first(self, cursor):
+        called.append("first")
+        return cursor
+
+    @engine.rule("a")
+    def second(self, cursor):
+        called.append("second")
+        return cursor.next()
+
+    engine.handle(etree.fromstring("<root><a/></root>"))
+    assert called == ["first", "second"]
+
+
+def test_engine_restart_after_mutation():
+    engine = MutationEngine(None)
+
+    @engine.rule("a", when="./b")
+    def lift_b(self, cursor):
+        return cursor.lift(cursor.node[0])
+
+    root = etree.fromstring("<root><a><b/>text<b/></a></root>")
+    engine.handle(root)
+    assert root == semantic("<root><a/><b/><a>text</a><b/></root>")
+
+
+def test_engine_handle_again():
+    engine = MutationEngine(None)
+
+    @engine.rule("a")
+    def remove_a(self, cursor):
+        return cursor.remove()
+
+    root = etree.fromstring("<root><a/></root>")
+    engine.handle(root)
+    assert not engine.memo
+
+    etree.SubElement(root, "a")
+    engine.handle(root)
+    assert root == semantic("<root/>")
+
+
+def test_depth():
+    cursor = SampleCursor("<root><a><b/></a><c/></root>")
+    assert cursor.depth == 0
+    assert cursor.next().depth == 1
+    assert cursor.next().depth == 2
+    assert cursor.next().node.tag == "c" and cursor.depth == 1
+    assert cursor.rewind().node.tag == "a" and cursor.depth == 1
+
+
+def test_is_inside():
+    document = etree.fromstring("<top><root><a/></root><after/></top>")
+    cursor = MutationCursor(document[0])
+    assert cursor.is_inside()
+    assert cursor.next().is_inside()
+    assert cursor.next().node.tag == "after"
+    assert not cursor.is_inside()
+
+
+def test_depth_after_move_to():
+    cursor = SampleCursor("<root><a><target/></a></root>")
+    cursor.move_to(cursor.root.find(".//target"))
+    assert cursor.depth == 2
+
+
+def test_depth_after_lift():
+    cursor = SampleCursor("<root><a><cursor/>text</a></root>")
+    cursor.lift()
+    assert cursor.depth == 1
+    assert cursor.depth == cursor.measure(cursor.node)
+
+
+def test_depth_after_remove():
+    cursor = SampleCursor(
+        "<root><a><cursor/><b/></a><c><d/></c><e/></root>")
+    cursor.depth
+    measured = []
+    measure = cursor.measure
+    cursor.measure = lambda node: measured.append(node) or measure(node)
+
+    assert cursor.remove().node.tag == "b" and cursor.depth == 2
+    assert cursor.remove().node.tag == "c" and cursor.depth == 1
+    assert cursor.adjoin().node.tag == "e" and cursor.depth == 1
+    assert cursor.is_inside()
+    assert not measured
+
+    # Into the child of the node that's removed
+    assert cursor.rewind().node.tag == "a"
+    assert cursor.remove().node.tag == "d"
+    assert not cursor.is_inside()
+    assert not measured
+
+
+def test_is_below():
+    cursor = SampleCursor("<root><a><b><cursor/></b></a><c/></root>")
+    root = cursor.root
+    assert cursor.is_below(root)
+    assert cursor.is_below(root[0]) and cursor.is_below(root[0][0])
+    assert not cursor.is_below(root[1])
+    assert not cursor.is_below(cursor.node)
+    assert not cursor.move_to(root).is_below(root)
@@ -0,0 +1,43 @@
+from aerate.prewarm import prewarm, shard
+from test.sample import SampleAerate
+
+
+def test_shard(tmp_path):
+    aerate = SampleAerate(tmp_path)
+    shards = shard(aerate)
+
+    assert sorted(id for ids in shards.values() for id in ids) \
+        == sorted(aerate.index.symbols)
+    for filename, ids in shards.items():
+        assert all(aerate[id].filename == filename for id in ids)
+        tags = [aerate.index[id].tag for id in ids]
+        assert tags == sorted(tags, key=lambda tag: tag == "compound")
+
+
+def test_prewarm(tmp_path):
+    aerate = SampleAerate(tmp_path)
+    count, failed = prewarm(aerate, 1)
+    assert count + failed == len(aerate.index)
+
+    aerate = SampleAerate(tmp_path)
+    output = aerate.find_member("unique", kind="function").describe()
+    assert aerate.render_cache.hits == 1
+    assert output == SampleAerate(tmp_path, render_cache_size=0) \
+        .find_member("unique", kind="function").describe()
+
+
+def test_prewarm_nodes(tmp_path):
+    aerate = SampleAerate(tmp_path)
+    count, failed = prewarm(aerate, 1, nodes=True)
+    assert count + failed == len(aerate.index)
+
+    aerate = SampleAerate(tmp_path)
+    aeration = aerate.find_member("unique", kind="function")
+    assert aeration.describe(as_nodes=True)
+    assert aerate.render_cache.hits == 1
+    assert ("adjusted", aeration.id) not in aeration.entry.memo
+
+
+def test_prewarm_disabled(tmp_path):
+    aerate = SampleAerate(tmp_path, render_cache_size=0)
+    assert prewarm(aerate, 1) == (0, 0)